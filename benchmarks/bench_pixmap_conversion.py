@@ -0,0 +1,75 @@
+"""fitz.Pixmap -> Qt 图像转换的微基准测试
+
+对比旧的 PPM 编码/解码路径与直接包装 pix.samples 的零复制路径。
+用法: python benchmarks/bench_pixmap_conversion.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QApplication
+
+from pdf_handler import pixmap_to_qimage
+
+
+def make_a4_page():
+    """生成一个包含文字和矢量图形的A4页面"""
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for i in range(40):
+        page.insert_text((50, 60 + i * 18), f"Line {i}: The quick brown fox jumps over the lazy dog", fontsize=11)
+    for i in range(20):
+        page.draw_rect(fitz.Rect(50 + i * 20, 780, 65 + i * 20, 820), color=(0, 0, 1), fill=(i / 20, 0.5, 0.2))
+    return doc, page
+
+
+def ppm_round_trip(pix):
+    img = QPixmap()
+    img.loadFromData(pix.tobytes("ppm"))
+    return img
+
+
+def zero_copy_qimage(pix):
+    return pixmap_to_qimage(pix)
+
+
+def zero_copy_qpixmap(pix):
+    return QPixmap.fromImage(pixmap_to_qimage(pix))
+
+
+def measure(func, pix, repeat):
+    func(pix)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(pix)
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fitz.Pixmap转换微基准")
+    parser.add_argument("--repeat", type=int, default=10, help="每项测量的重复次数")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)  # noqa: F841 QPixmap需要GUI应用
+    doc, page = make_a4_page()
+
+    print(f"{'DPI':>5} {'尺寸':>12} {'PPM往返(ms)':>12} {'QImage(ms)':>11} {'QPixmap(ms)':>12} {'加速比':>7}")
+    for dpi in (96, 300, 600):
+        pix = page.get_pixmap(dpi=dpi)
+        ppm_ms = measure(ppm_round_trip, pix, args.repeat)
+        image_ms = measure(zero_copy_qimage, pix, args.repeat)
+        pixmap_ms = measure(zero_copy_qpixmap, pix, args.repeat)
+        size = f"{pix.width}x{pix.height}"
+        print(f"{dpi:>5} {size:>12} {ppm_ms:>12.2f} {image_ms:>11.3f} {pixmap_ms:>12.2f} {ppm_ms / pixmap_ms:>6.1f}x")
+
+    doc.close()
+
+
+if __name__ == "__main__":
+    main()
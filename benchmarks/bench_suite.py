@@ -0,0 +1,503 @@
+"""渲染、合成、显示和打印路径的基准测试套件
+
+用fitz在本地生成合成PDF（纯文字、矢量密集、图片密集、混合页面尺寸，10到10000页），
+在无窗口环境（offscreen Qt，打印到PDF格式的QPrinter）中对每种每张页数和纸张尺寸测量:
+    render   PDFHandler.render_page（逐页）
+    compose  LayoutHandler.draw_adaptive_pages（逐张重排页面，96 DPI）
+    display  DisplayHandler.display_adaptive_pages（逐张，含显示到视口）
+    print    PrintPipeline.print_to（与主程序打印相同的条带流水线）
+报告每秒页数、p50/p95延迟（毫秒）和峰值RSS，结果写为JSON，可用 --baseline 与之前的结果对比。
+
+用法:
+    python benchmarks/bench_suite.py -o results.json
+    python benchmarks/bench_suite.py --kinds text --pages 10 --paper-sizes A4 --pages-per-sheet 1,4
+    python benchmarks/bench_suite.py --pages 10000 --paths render,display --baseline results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import fitz  # PyMuPDF
+from PyQt5.QtCore import QPoint, QRect
+from PyQt5.QtGui import QImage, QPainter, QRegion
+from PyQt5.QtPrintSupport import QPrinter
+from PyQt5.QtWidgets import QApplication, QScrollArea
+
+from pdf_handler import PDFHandler
+from scaling_handler import ScalingHandler
+from page_size_handler import PageSizeHandler
+from layout_handler import LayoutHandler
+from print_handler import PrintHandler
+from print_pipeline import PrintPipeline
+from memory_budget import MemoryBudget
+from display_handler import DisplayHandler
+from tiled_page_label import TiledPageLabel
+from tracing import Tracer, tracer
+
+
+KINDS = ["text", "vector", "image", "mixed"]
+PATHS = ["render", "compose", "display", "print"]
+PAPER_SIZES = ["A0", "A1", "A2", "A3", "A4", "A5", "A6", "Letter", "Legal", "Tabloid"]
+PAGES_PER_SHEET_OPTIONS = [1, 2, 4, 6, 9, 16]
+
+# 混合页面尺寸文档循环使用的页面尺寸（点）
+MIXED_PAGE_SIZES = [(595, 842), (612, 792), (1191, 842), (420, 595), (792, 1224)]
+# 每种内容的模板页面数（文档页面在模板之间循环）
+TEMPLATE_VARIANTS = 8
+# 显示路径的视口大小（逻辑像素）
+VIEWPORT_SIZE = (1000, 800)
+
+
+def _make_image_streams(count=4, size=600):
+    """生成几张不同的PNG图片（图片密集文档中的页面轮流引用）"""
+    streams = []
+    for i in range(count):
+        pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, size, size), False)
+        for y in range(0, size, 20):
+            shade = (y * 255 // size + i * 60) % 256
+            pix.set_rect(fitz.IRect(0, y, size, y + 20), ((shade + 80) % 256, shade, (255 - shade + i * 40) % 256))
+        streams.append(pix.tobytes("png"))
+    return streams
+
+
+def _draw_text(page, rect, lines=40):
+    for i in range(lines):
+        y = rect.y0 + 40 + i * (rect.height - 80) / lines
+        page.insert_text((rect.x0 + 40, y), f"Line {i}: The quick brown fox jumps over the lazy dog 0123456789",
+                         fontsize=10)
+
+
+def _draw_vectors(page, rect, count=200, seed=0):
+    shape = page.new_shape()
+    for i in range(count):
+        k = (i * 7919 + seed * 104729) % 1000 / 1000.0
+        x = rect.x0 + 30 + (rect.width - 90) * ((i % 20) / 20.0)
+        y = rect.y0 + 30 + (rect.height - 90) * ((i // 20 % 10) / 10.0 + k / 12.0)
+        shape.draw_bezier((x, y), (x + 40, y - 30 * k), (x + 20, y + 50), (x + 60, y + 10))
+        shape.finish(color=(k, 0.2, 1 - k), width=0.8)
+        shape.draw_rect(fitz.Rect(x, y + 20, x + 25, y + 35))
+        shape.finish(color=(0, 0, 0), fill=(1 - k, k, 0.5), fill_opacity=0.6)
+    shape.commit()
+
+
+def _draw_images(page, image_streams, image_xrefs, cells, variant):
+    for cell, cell_rect in enumerate(cells):
+        stream_index = (variant + cell) % len(image_streams)
+        # 同一张图片只嵌入一次，之后按xref引用
+        if stream_index in image_xrefs:
+            page.insert_image(cell_rect, xref=image_xrefs[stream_index])
+        else:
+            image_xrefs[stream_index] = page.insert_image(cell_rect, stream=image_streams[stream_index])
+
+
+def _draw_template(page, kind, variant, image_streams, image_xrefs):
+    rect = page.rect
+    if kind == "text":
+        _draw_text(page, rect)
+    elif kind == "vector":
+        _draw_vectors(page, rect, seed=variant)
+    elif kind == "image":
+        cell_width, cell_height = (rect.width - 60) / 2, (rect.height - 60) / 2
+        cells = [fitz.Rect(30 + col * cell_width, 30 + row * cell_height,
+                           20 + (col + 1) * cell_width, 20 + (row + 1) * cell_height)
+                 for row in range(2) for col in range(2)]
+        _draw_images(page, image_streams, image_xrefs, cells, variant)
+    else:
+        _draw_text(page, rect, lines=15)
+        _draw_vectors(page, fitz.Rect(rect.x0, rect.y0 + rect.height / 3, rect.x1, rect.y1), count=60, seed=variant)
+        _draw_images(page, image_streams, image_xrefs,
+                     [fitz.Rect(rect.x1 - 220, rect.y0 + 30, rect.x1 - 30, rect.y0 + 220)], variant)
+
+
+def generate_pdf(path, kind, page_count):
+    """生成一份合成PDF
+
+    先画出 TEMPLATE_VARIANTS 个模板页面，文档页面以Form XObject引用模板（show_pdf_page），
+    10000页的文档也能在几秒内生成，文件不会随页数膨胀。
+    """
+    image_streams = _make_image_streams() if kind in ("image", "mixed") else []
+    sizes = MIXED_PAGE_SIZES if kind == "mixed" else [(595, 842)]
+    template = fitz.open()
+    image_xrefs = {}
+    for variant in range(TEMPLATE_VARIANTS):
+        for width, height in sizes:
+            page = template.new_page(width=width, height=height)
+            _draw_template(page, kind, variant, image_streams, image_xrefs)
+
+    doc = fitz.open()
+    for page_index in range(page_count):
+        size_index = page_index % len(sizes)
+        width, height = sizes[size_index]
+        page = doc.new_page(width=width, height=height)
+        page.show_pdf_page(page.rect, template, (page_index % TEMPLATE_VARIANTS) * len(sizes) + size_index)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    template.close()
+
+
+def get_document(workdir, kind, page_count):
+    """获取（必要时生成）指定类型和页数的合成PDF路径"""
+    path = os.path.join(workdir, f"{kind}_{page_count}.pdf")
+    if not os.path.exists(path):
+        generate_pdf(path, kind, page_count)
+    return path
+
+
+def reset_peak_rss():
+    """重置本进程的峰值RSS（仅Linux支持，其他平台的峰值为进程启动以来的最大值）"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss_mb():
+    """本进程的峰值RSS（MB），无法获取时返回None"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return None
+
+
+def get_children_peak_rss_mb():
+    """已结束子进程（打印进程）中最大的峰值RSS（MB）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, fraction):
+    """线性插值的百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies_ms, pages, seconds):
+    return {
+        "units": len(latencies_ms),
+        "pages": pages,
+        "seconds": round(seconds, 4),
+        "pages_per_sec": round(pages / seconds, 2) if seconds > 0 else None,
+        "p50_ms": round(percentile(latencies_ms, 0.5), 3) if latencies_ms else None,
+        "p95_ms": round(percentile(latencies_ms, 0.95), 3) if latencies_ms else None,
+    }
+
+
+def sample_indices(count, limit):
+    """在 0..count-1 中均匀取至多 limit 个索引"""
+    if count <= limit:
+        return list(range(count))
+    return sorted({i * (count - 1) // (limit - 1) for i in range(limit)}) if limit > 1 else [0]
+
+
+def clear_render_state(pdf_handler):
+    """清空渲染缓存和显示列表，使每次测量都从fitz渲染开始"""
+    pdf_handler.render_cache.clear()
+    pdf_handler.display_lists.clear()
+
+
+class Handlers:
+    """一组按测试设置配置好的处理模块"""
+
+    def __init__(self, pdf_handler, paper_size, pages_per_sheet):
+        self.pdf_handler = pdf_handler
+        self.scaling_handler = ScalingHandler()
+        self.page_size_handler = PageSizeHandler()
+        self.page_size_handler.set_page_size(paper_size)
+        self.page_size_handler.set_page_orientation(pdf_handler.get_page_orientation(0))
+        self.layout_handler = LayoutHandler(self.page_size_handler)
+        self.layout_handler.set_pages_per_sheet(pages_per_sheet)
+        self.layout_handler.set_adaptive_mode(True)
+        self.pages_per_sheet = pages_per_sheet
+
+    def get_sheet_count(self):
+        return (self.pdf_handler.get_page_count() + self.pages_per_sheet - 1) // self.pages_per_sheet
+
+    def get_sheet_page_count(self, sheet_index):
+        start = sheet_index * self.pages_per_sheet
+        return min(self.pages_per_sheet, self.pdf_handler.get_page_count() - start)
+
+
+def bench_render(pdf_handler, max_units, dpi):
+    latencies = []
+    pages = sample_indices(pdf_handler.get_page_count(), max_units)
+    start_time = time.perf_counter()
+    for page_index in pages:
+        clear_render_state(pdf_handler)
+        t = time.perf_counter()
+        pdf_handler.render_page(page_index, dpi)
+        latencies.append((time.perf_counter() - t) * 1000)
+    return summarize(latencies, len(pages), time.perf_counter() - start_time)
+
+
+def bench_compose(handlers, max_units):
+    pdf_handler = handlers.pdf_handler
+    latencies = []
+    pages = 0
+    start_time = time.perf_counter()
+    for sheet_index in sample_indices(handlers.get_sheet_count(), max_units):
+        start_page = sheet_index * handlers.pages_per_sheet
+        page_count = handlers.get_sheet_page_count(sheet_index)
+        pdf_width, pdf_height = pdf_handler.get_page_size(start_page)
+        width_pts, height_pts = handlers.page_size_handler.adjust_dimensions_for_orientation(
+            *handlers.page_size_handler.get_page_size_points(), pdf_width, pdf_height)
+        target_width, target_height = int(width_pts * 96 / 72), int(height_pts * 96 / 72)
+
+        clear_render_state(pdf_handler)
+        t = time.perf_counter()
+        image = QImage(target_width, target_height, QImage.Format_RGB32)
+        image.fill(0xFFFFFFFF)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        handlers.layout_handler.draw_adaptive_pages(
+            painter, pdf_handler, handlers.scaling_handler, target_width, target_height, start_page, page_count)
+        painter.end()
+        latencies.append((time.perf_counter() - t) * 1000)
+        pages += page_count
+    return summarize(latencies, pages, time.perf_counter() - start_time)
+
+
+def bench_display(handlers, max_units):
+    """与主窗口相同的显示路径（同步渲染），包括把视口中可见的部分绘制出来（超大页面按图块）"""
+    pdf_handler = handlers.pdf_handler
+    scroll_area = QScrollArea()
+    scroll_area.resize(*VIEWPORT_SIZE)
+    page_label = TiledPageLabel()
+    scroll_area.setWidget(page_label)
+    display_handler = DisplayHandler(page_label, pdf_handler, handlers.scaling_handler,
+                                     handlers.page_size_handler, handlers.layout_handler, scroll_area)
+    viewport = QImage(*VIEWPORT_SIZE, QImage.Format_RGB32)
+    viewport_region = QRegion(QRect(0, 0, *VIEWPORT_SIZE))
+
+    latencies = []
+    pages = 0
+    start_time = time.perf_counter()
+    for sheet_index in sample_indices(handlers.get_sheet_count(), max_units):
+        clear_render_state(pdf_handler)
+        display_handler.clear_sheet_cache()
+        t = time.perf_counter()
+        display_handler.display_adaptive_pages(sheet_index * handlers.pages_per_sheet, background=False)
+        page_label.render(viewport, QPoint(), viewport_region)
+        latencies.append((time.perf_counter() - t) * 1000)
+        pages += handlers.get_sheet_page_count(sheet_index)
+    elapsed = time.perf_counter() - start_time
+    scroll_area.deleteLater()
+    return summarize(latencies, pages, elapsed)
+
+
+def bench_print(handlers, max_units, workdir, print_dpi, workers, memory_budget_mb):
+    """与主窗口相同的打印路径，输出到PDF格式的QPrinter；延迟为相邻两张页面送出打印机的间隔"""
+    pdf_handler = handlers.pdf_handler
+    print_handler = PrintHandler()
+    print_handler.set_page_size(handlers.page_size_handler.page_size)
+    print_handler.set_page_orientation(handlers.page_size_handler.page_orientation)
+
+    printer = QPrinter(QPrinter.HighResolution)
+    printer.setOutputFormat(QPrinter.PdfFormat)
+    output_path = os.path.join(workdir, "print_output.pdf")
+    printer.setOutputFileName(output_path)
+    print_handler.configure_printer(printer)
+    if print_dpi:
+        printer.setResolution(print_dpi)
+
+    cache_budget_mb = pdf_handler.render_cache.max_bytes / (1024 * 1024)
+    memory_budget = MemoryBudget(memory_budget_mb)
+    memory_budget.register_cache("pages", pdf_handler.render_cache, min_mb=16)
+    pipeline = PrintPipeline(pdf_handler, handlers.scaling_handler, handlers.page_size_handler,
+                             handlers.layout_handler, workers=workers, memory_budget=memory_budget)
+    total_sheets = min(max_units, handlers.get_sheet_count())
+    spooled_times = []
+
+    def on_progress(rendered, spooled):
+        while len(spooled_times) < spooled:
+            spooled_times.append(time.perf_counter())
+
+    clear_render_state(pdf_handler)
+    start_time = time.perf_counter()
+    stats = pipeline.print_to(printer, total_sheets, on_progress)
+    elapsed = time.perf_counter() - start_time
+    latencies = [(t - previous) * 1000 for previous, t in zip([start_time] + spooled_times, spooled_times)]
+    pages = sum(handlers.get_sheet_page_count(i) for i in range(total_sheets))
+    result = summarize(latencies, pages, elapsed)
+    result["raster_size"] = list(stats["raster_size"])
+    result["workers"] = stats["workers"]
+    result["window"] = stats["window"]
+    result["band_height"] = stats["band_height"]
+    result["peak_memory_mb"] = stats.get("peak_memory_mb")
+    # 恢复渲染缓存的预算
+    memory_budget.unregister_cache("pages")
+    pdf_handler.render_cache.set_memory_budget(cache_budget_mb)
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return result
+
+
+def run_case(path_name, pdf_handler, paper_size, pages_per_sheet, options):
+    reset_peak_rss()
+    if path_name == "render":
+        result = bench_render(pdf_handler, options.max_units, options.render_dpi)
+    else:
+        handlers = Handlers(pdf_handler, paper_size, pages_per_sheet)
+        if path_name == "compose":
+            result = bench_compose(handlers, options.max_units)
+        elif path_name == "display":
+            result = bench_display(handlers, options.max_units)
+        else:
+            result = bench_print(handlers, options.max_units, options.workdir, options.print_dpi, options.print_workers,
+                                 options.memory_budget)
+    peak_rss = get_peak_rss_mb()
+    result["peak_rss_mb"] = round(peak_rss, 1) if peak_rss is not None else None
+    if path_name == "print":
+        children_peak = get_children_peak_rss_mb()
+        result["children_peak_rss_mb"] = round(children_peak, 1) if children_peak is not None else None
+    return result
+
+
+def case_id(case):
+    return "/".join(str(case[key]) for key in ("path", "kind", "page_count", "paper_size", "pages_per_sheet"))
+
+
+def compare_with_baseline(cases, baseline_path):
+    """打印与之前结果相比的每秒页数变化"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {case_id(case): case for case in json.load(f)["cases"]}
+    print(f"\n与基准 {baseline_path} 对比（每秒页数）:")
+    for case in cases:
+        old = baseline.get(case_id(case))
+        if old is None or not old.get("pages_per_sec") or not case.get("pages_per_sec"):
+            continue
+        ratio = case["pages_per_sec"] / old["pages_per_sec"]
+        print(f"  {case_id(case):<40} {old['pages_per_sec']:>9.1f} -> {case['pages_per_sec']:>9.1f}  {ratio:>5.2f}x")
+
+
+def parse_list(text, choices=None, convert=str):
+    values = [convert(part.strip()) for part in text.split(",") if part.strip()]
+    if choices is not None:
+        for value in values:
+            if value not in choices:
+                raise argparse.ArgumentTypeError(f"无效的取值: {value}（可选: {', '.join(map(str, choices))}）")
+    return values
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PDF Printer 渲染/合成/显示/打印路径基准测试")
+    parser.add_argument("--kinds", default=",".join(KINDS), type=lambda s: parse_list(s, KINDS),
+                        help="文档类型（逗号分隔）: text,vector,image,mixed")
+    parser.add_argument("--pages", default="10,100,1000", type=lambda s: parse_list(s, convert=int),
+                        help="文档页数（逗号分隔，10到10000）")
+    parser.add_argument("--paths", default=",".join(PATHS), type=lambda s: parse_list(s, PATHS),
+                        help="测量路径（逗号分隔）: render,compose,display,print")
+    parser.add_argument("--paper-sizes", default=",".join(PAPER_SIZES), type=lambda s: parse_list(s, PAPER_SIZES),
+                        help="纸张尺寸（逗号分隔）")
+    parser.add_argument("--pages-per-sheet", default=",".join(map(str, PAGES_PER_SHEET_OPTIONS)),
+                        type=lambda s: parse_list(s, PAGES_PER_SHEET_OPTIONS, int), help="每张页数（逗号分隔）")
+    parser.add_argument("--max-units", type=int, default=8,
+                        help="每个测试最多测量的页面/重排页面数（在文档中均匀抽取）")
+    parser.add_argument("--render-dpi", type=float, default=150, help="render路径的渲染DPI")
+    parser.add_argument("--print-dpi", type=int, default=300, help="打印分辨率（0表示QPrinter高分辨率模式的默认值）")
+    parser.add_argument("--print-workers", type=int, default=None, help="打印进程数（默认与主程序相同，0表示在本进程中栅格化）")
+    parser.add_argument("--memory-budget", type=float, default=0, metavar="MB",
+                        help="print路径的全局内存预算（默认0表示不限制）")
+    parser.add_argument("--workdir", default=None, help="合成PDF的存放目录（默认为临时目录，可复用以跳过生成）")
+    parser.add_argument("--trace", metavar="FILE", default=None,
+                        help="记录各阶段耗时（每个测试的汇总写入JSON），并导出Chrome跟踪事件文件")
+    parser.add_argument("-o", "--output", default=None, help="JSON结果文件（默认输出到标准输出）")
+    parser.add_argument("--baseline", default=None, help="之前的JSON结果文件，用于对比")
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    app = QApplication.instance() or QApplication(["bench_suite"])  # noqa: F841 QPrinter/QPixmap需要GUI应用
+    options.workdir = options.workdir or os.path.join(tempfile.gettempdir(), "pdf_printer_bench")
+    os.makedirs(options.workdir, exist_ok=True)
+
+    tracer.set_enabled(bool(options.trace))
+    trace_events = []
+    cases = []
+    for kind in options.kinds:
+        for page_count in options.pages:
+            t = time.perf_counter()
+            document_path = get_document(options.workdir, kind, page_count)
+            print(f"{kind} x {page_count} 页: {document_path}（{time.perf_counter() - t:.1f} 秒）", file=sys.stderr)
+            pdf_handler = PDFHandler()
+            if not pdf_handler.load_pdf(document_path):
+                raise RuntimeError(f"无法加载PDF文件: {document_path}")
+            try:
+                for path_name in options.paths:
+                    # 渲染路径与纸张尺寸和布局无关
+                    layouts = ([(None, None)] if path_name == "render" else
+                               [(size, pps) for size in options.paper_sizes for pps in options.pages_per_sheet])
+                    for paper_size, pages_per_sheet in layouts:
+                        case = {"path": path_name, "kind": kind, "page_count": page_count,
+                                "paper_size": paper_size, "pages_per_sheet": pages_per_sheet}
+                        case.update(run_case(path_name, pdf_handler, paper_size, pages_per_sheet, options))
+                        if options.trace:
+                            events = tracer.drain()
+                            case["stages"] = Tracer.summarize(events)
+                            trace_events.extend(events)
+                        cases.append(case)
+                        print(f"  {case_id(case):<40} {case['pages_per_sec']:>9.1f} 页/秒  "
+                              f"p50 {case['p50_ms']:>8.1f} ms  p95 {case['p95_ms']:>8.1f} ms  "
+                              f"峰值RSS {case['peak_rss_mb']} MB", file=sys.stderr)
+            finally:
+                pdf_handler.close()
+
+    result = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pymupdf": fitz.VersionBind,
+            "cpu_count": os.cpu_count(),
+        },
+        "options": {key: value for key, value in vars(options).items()
+                    if key not in ("output", "baseline", "trace")},
+        "cases": cases,
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if options.trace:
+        tracer.add_events(trace_events)
+        tracer.export_chrome_trace(options.trace)
+        print(tracer.format_summary(), file=sys.stderr)
+
+    if options.baseline:
+        compare_with_baseline(cases, options.baseline)
+
+
+if __name__ == "__main__":
+    main()
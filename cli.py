@@ -0,0 +1,239 @@
+"""PDF Printer 命令行批处理模式 v2.0
+
+不创建主窗口（使用offscreen平台），批量生成多页合一PDF或发送到指定打印机。
+
+示例:
+    python cli.py a.pdf b.pdf -o out --paper-size A4 --pages-per-sheet 4
+    python cli.py manual.pdf --printer Office_Printer --pages 1-10,15 --rotation 90
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from pdf_handler import PDFHandler
+from scaling_handler import ScalingHandler
+from page_size_handler import PageSizeHandler
+from layout_handler import LayoutHandler
+from print_handler import PrintHandler
+from imposition_handler import ImpositionHandler
+from print_pipeline import PrintPipeline
+from memory_budget import DEFAULT_BUDGET_MB, MemoryBudget
+from tracing import tracer
+
+
+PAPER_SIZES = ["A0", "A1", "A2", "A3", "A4", "A5", "A6", "Letter", "Legal", "Tabloid"]
+PAGES_PER_SHEET_OPTIONS = [1, 2, 4, 6, 9, 16]
+# 写入结果摘要的内存峰值字段
+MEMORY_SUMMARY_KEYS = ["peak_memory_mb", "peak_rss_mb", "peak_traced_mb"]
+
+
+def parse_page_ranges(text, page_count):
+    """解析页面范围（例如 "1-3,5,8-"，从1开始），返回从0开始的页面索引列表"""
+    if not text:
+        return list(range(page_count))
+
+    page_indices = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start = int(start_text) if start_text.strip() else 1
+            end = int(end_text) if end_text.strip() else page_count
+        else:
+            start = end = int(part)
+        if start < 1 or end > page_count or start > end:
+            raise ValueError(f"页面范围无效: {part}（共 {page_count} 页）")
+        page_indices.extend(range(start - 1, end))
+    return page_indices
+
+
+def _build_handlers(options, pdf_handler):
+    """根据命令行选项创建并配置各处理模块"""
+    scaling_handler = ScalingHandler()
+    scaling_handler.set_scale_factor(options["scale"] / 100.0)
+    scaling_handler.set_rotation_angle(options["rotation"])
+
+    page_size_handler = PageSizeHandler()
+    page_size_handler.set_page_size(options["paper_size"])
+    orientation = options["orientation"]
+    if orientation == "auto":
+        # 与界面一致：按第一页的固有方向
+        orientation = pdf_handler.get_page_orientation(0)
+    page_size_handler.set_page_orientation(orientation)
+
+    layout_handler = LayoutHandler(page_size_handler)
+    layout_handler.set_pages_per_sheet(options["pages_per_sheet"])
+    layout_handler.set_adaptive_mode(True)
+
+    print_handler = PrintHandler()
+    print_handler.set_page_size(page_size_handler.page_size)
+    print_handler.set_page_orientation(page_size_handler.page_orientation)
+    return scaling_handler, page_size_handler, layout_handler, print_handler
+
+
+def _print_document(input_path, pdf_handler, options, scaling_handler, page_size_handler, layout_handler, print_handler,
+                    memory_budget):
+    """将文档按布局逐条送入指定打印机（条带和渲染缓存受内存预算限制），返回打印统计信息"""
+    from PyQt5.QtGui import QGuiApplication
+    from PyQt5.QtPrintSupport import QPrinter, QPrinterInfo
+
+    app = QGuiApplication.instance() or QGuiApplication(["pdf_printer"])  # noqa: F841 QPrinter需要GUI应用
+
+    printer_info = QPrinterInfo.printerInfo(options["printer"])
+    if printer_info.isNull():
+        raise RuntimeError(f"找不到打印机: {options['printer']}")
+    printer = QPrinter(printer_info, QPrinter.HighResolution)
+    printer.setDocName(os.path.basename(input_path))
+    print_handler.configure_printer(printer)
+
+    # 多个文件已经在多个进程中并行处理，每个文件在本进程中栅格化
+    pipeline = PrintPipeline(pdf_handler, scaling_handler, page_size_handler, layout_handler,
+                             workers=0, memory_budget=memory_budget)
+    total_sheets = (pdf_handler.get_page_count() + layout_handler.pages_per_sheet - 1) // layout_handler.pages_per_sheet
+    return pipeline.print_to(printer, total_sheets)
+
+
+def process_file(input_path, options):
+    """处理单个文件（在进程池中运行），返回结果摘要"""
+    start_time = time.perf_counter()
+    result = {"file": input_path, "ok": False, "pages": 0, "sheets": 0, "output": None, "error": None}
+    # 跟踪区间随结果返回（文件可能在其他进程中处理）
+    tracer.set_enabled(options["trace"])
+
+    pdf_handler = PDFHandler()
+    if not pdf_handler.load_pdf(input_path):
+        result["error"] = "无法加载PDF文件"
+        result["seconds"] = time.perf_counter() - start_time
+        return result
+
+    # 每个进程按分到的内存预算限制渲染缓存和在途打印条带
+    memory_budget = MemoryBudget(options["memory_budget_mb"], options["memory_sampling"])
+    memory_budget.register_cache("pages", pdf_handler.render_cache, min_mb=16)
+
+    try:
+        page_indices = parse_page_ranges(options["pages"], pdf_handler.get_page_count())
+        scaling_handler, page_size_handler, layout_handler, print_handler = _build_handlers(options, pdf_handler)
+        pages_per_sheet = layout_handler.pages_per_sheet
+        result["pages"] = len(page_indices)
+        result["sheets"] = (len(page_indices) + pages_per_sheet - 1) // pages_per_sheet
+
+        if options["printer"]:
+            if len(page_indices) != pdf_handler.get_page_count():
+                pdf_handler.select_pages(page_indices)
+            stats = _print_document(input_path, pdf_handler, options, scaling_handler, page_size_handler,
+                                    layout_handler, print_handler, memory_budget)
+            result["output"] = f"打印机 {options['printer']}"
+        else:
+            base_name = os.path.splitext(os.path.basename(input_path))[0]
+            output_path = os.path.join(options["output_dir"], f"{base_name}{options['suffix']}.pdf")
+            imposition_handler = ImpositionHandler(page_size_handler, layout_handler, scaling_handler)
+            with memory_budget.track_job() as job_memory:
+                imposition_handler.impose(pdf_handler, output_path, page_indices)
+            stats = job_memory.get_stats()
+            result["output"] = output_path
+        result.update({key: stats[key] for key in MEMORY_SUMMARY_KEYS if stats.get(key) is not None})
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        pdf_handler.close()
+
+    result["seconds"] = time.perf_counter() - start_time
+    result["trace"] = tracer.drain()
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PDF Printer 命令行批处理：生成多页合一PDF或直接打印")
+    parser.add_argument("inputs", nargs="+", help="输入的PDF文件")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("-o", "--output-dir", help="输出目录（生成多页合一PDF）")
+    target.add_argument("--printer", help="打印机名称（直接打印）")
+    parser.add_argument("--paper-size", choices=PAPER_SIZES, default="A4", help="纸张尺寸（默认A4）")
+    parser.add_argument("--orientation", choices=["auto", "portrait", "landscape"], default="auto",
+                        help="纸张方向（默认auto：按第一页的方向）")
+    parser.add_argument("--pages-per-sheet", type=int, choices=PAGES_PER_SHEET_OPTIONS, default=1,
+                        help="每张纸的页数（默认1）")
+    parser.add_argument("--scale", type=float, default=100.0, help="缩放百分比（默认100）")
+    parser.add_argument("--rotation", type=int, choices=[0, 90, 180, 270], default=0, help="旋转角度（默认0）")
+    parser.add_argument("--pages", default="", help="页面范围，例如 1-3,5,8-（默认全部）")
+    parser.add_argument("--suffix", default="_nup", help="输出文件名后缀（默认_nup）")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="并行进程数（默认CPU核数）")
+    parser.add_argument("--memory-budget", type=float, default=DEFAULT_BUDGET_MB, metavar="MB",
+                        help=f"全部进程合计的内存预算（默认{DEFAULT_BUDGET_MB}，0表示不限制），"
+                             "超出时收缩渲染缓存并降低在途打印条带")
+    parser.add_argument("--memory-sampling", choices=["off", "rss", "tracemalloc"], default="rss",
+                        help="任务期间采样进程内存峰值的方式，写入摘要（默认rss，off表示不采样）")
+    parser.add_argument("--trace", metavar="FILE", help="记录各阶段耗时并导出Chrome跟踪事件JSON文件")
+    return parser
+
+
+def print_summary(results, total_seconds):
+    """输出每个文件的耗时摘要"""
+    for result in results:
+        status = "成功" if result["ok"] else "失败"
+        detail = result["output"] if result["ok"] else result["error"]
+        memory = ""
+        if result.get("peak_rss_mb") is not None:
+            memory += f", RSS峰值 {result['peak_rss_mb']} MB"
+        if result.get("peak_memory_mb") is not None:
+            memory += f", 缓存与条带峰值 {result['peak_memory_mb']} MB"
+        if result.get("peak_traced_mb") is not None:
+            memory += f", tracemalloc峰值 {result['peak_traced_mb']} MB"
+        print(f"[{status}] {result['file']}: {result['pages']} 页 -> {result['sheets']} 张, "
+              f"{result['seconds']:.2f} 秒{memory}, {detail}")
+    succeeded = sum(1 for result in results if result["ok"])
+    print(f"共 {len(results)} 个文件，成功 {succeeded} 个，失败 {len(results) - succeeded} 个，"
+          f"总用时 {total_seconds:.2f} 秒")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.scale <= 0:
+        parser.error("缩放比例必须大于0")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    options = {
+        "output_dir": args.output_dir,
+        "printer": args.printer,
+        "paper_size": args.paper_size,
+        "orientation": args.orientation,
+        "pages_per_sheet": args.pages_per_sheet,
+        "scale": args.scale,
+        "rotation": args.rotation,
+        "pages": args.pages,
+        "suffix": args.suffix,
+        "trace": bool(args.trace),
+        "memory_sampling": None if args.memory_sampling == "off" else args.memory_sampling,
+    }
+
+    start_time = time.perf_counter()
+    jobs = max(1, min(args.jobs, len(args.inputs)))
+    # 每个进程同时只处理一个文件，预算在进程之间平分
+    options["memory_budget_mb"] = args.memory_budget / jobs
+    if jobs == 1:
+        results = [process_file(path, options) for path in args.inputs]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(process_file, args.inputs, [options] * len(args.inputs)))
+
+    print_summary(results, time.perf_counter() - start_time)
+    if args.trace:
+        tracer.clear()
+        for result in results:
+            tracer.add_events(result.get("trace"))
+        tracer.export_chrome_trace(args.trace)
+        print(tracer.format_summary())
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
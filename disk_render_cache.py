@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import struct
+import zlib
+from collections import OrderedDict
+
+from thumbnail_cache import get_default_cache_dir
+
+
+def make_document_fingerprint(pdf_document, file_path):
+    """计算文档指纹：PDF文件标识符（trailer中的/ID）+ 文件修改时间和大小
+
+    不需要读取整个文件；文件被修改后修改时间或大小会变化，旧的缓存自然失效。
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    document_id = ""
+    try:
+        if pdf_document.is_pdf:
+            document_id = pdf_document.xref_get_key(-1, "ID")[1]
+    except Exception:
+        pass
+    text = f"{document_id}|{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class DiskRenderCache:
+    """跨会话的磁盘渲染缓存 v2.0
+
+    键为 (文档指纹, 页码, DPI, 旋转角度, 色彩空间)，像素数据以zlib压缩保存。
+    总大小超过 max_disk_mb 时按最近使用时间在所有文档之间进行LRU淘汰。
+    渲染进程只写入文件（save），索引和淘汰由主进程负责（record / put）。
+    """
+
+    # 文件头：魔数, 宽, 高, 每行字节数, 通道数, 是否有alpha
+    HEADER = struct.Struct("<4sIIIIB")
+    MAGIC = b"PPRC"
+
+    def __init__(self, cache_dir=None, max_disk_mb=1024, compress_level=1):
+        self.cache_dir = cache_dir or get_default_cache_dir("renders")
+        self.max_bytes = int(max_disk_mb * 1024 * 1024)
+        self.compress_level = compress_level
+        self._index = None  # 文件路径 -> 字节数（从最久未使用到最近使用）
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_path(self, fingerprint, key):
+        page_index, dpi, rotation, colorspace = key
+        return os.path.join(self.cache_dir, fingerprint, f"{page_index}_{dpi:g}_{rotation}_{colorspace}.bin")
+
+    def _load_index(self):
+        """首次使用时扫描缓存目录，按修改时间建立LRU索引"""
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for document_dir in os.scandir(self.cache_dir):
+                if not document_dir.is_dir():
+                    continue
+                for entry in os.scandir(document_dir.path):
+                    if entry.name.endswith(".bin"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.path, stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((path, size) for _, path, size in entries)
+        self.current_bytes = sum(self._index.values())
+
+    def contains(self, fingerprint, key):
+        if fingerprint is None:
+            return False
+        self._load_index()
+        return self._get_path(fingerprint, key) in self._index
+
+    def load(self, fingerprint, key):
+        """读取缓存的像素数据 (samples, width, height, stride, n, alpha)，不存在时返回None"""
+        if not self.contains(fingerprint, key):
+            self.misses += 1
+            return None
+        path = self._get_path(fingerprint, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, width, height, stride, n, alpha = self.HEADER.unpack_from(data)
+            if magic != self.MAGIC:
+                raise ValueError("文件格式错误")
+            samples = zlib.decompress(data[self.HEADER.size:])
+            os.utime(path)
+        except (OSError, ValueError, zlib.error, struct.error) as e:
+            logging.warning(f"无法读取磁盘渲染缓存: {str(e)}")
+            self._remove(path)
+            self.misses += 1
+            return None
+        self._index.move_to_end(path)
+        self.hits += 1
+        return samples, width, height, stride, n, bool(alpha)
+
+    def save(self, fingerprint, key, pix):
+        """把fitz.Pixmap写入缓存文件（可在渲染进程中调用），返回是否成功"""
+        if fingerprint is None:
+            return False
+        path = self._get_path(fingerprint, key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            header = self.HEADER.pack(self.MAGIC, pix.width, pix.height, pix.stride, pix.n, int(pix.alpha))
+            with open(temp_path, "wb") as f:
+                f.write(header)
+                f.write(zlib.compress(pix.samples, self.compress_level))
+            os.replace(temp_path, path)
+            return True
+        except OSError as e:
+            logging.warning(f"无法写入磁盘渲染缓存: {str(e)}")
+            return False
+
+    def record(self, fingerprint, key):
+        """登记已写入的缓存文件（主进程调用），必要时淘汰最久未使用的文件"""
+        if fingerprint is None:
+            return
+        self._load_index()
+        path = self._get_path(fingerprint, key)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        old_size = self._index.pop(path, 0)
+        self._index[path] = size
+        self.current_bytes += size - old_size
+        self._evict()
+
+    def put(self, fingerprint, key, pix):
+        """写入并登记缓存文件"""
+        if self.save(fingerprint, key, pix):
+            self.record(fingerprint, key)
+
+    def _remove(self, path):
+        self.current_bytes -= self._index.pop(path, 0)
+        try:
+            os.remove(path)
+            document_dir = os.path.dirname(path)
+            if not os.listdir(document_dir):
+                os.rmdir(document_dir)
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._index and self.current_bytes > self.max_bytes:
+            path = next(iter(self._index))
+            self._remove(path)
+            self.evictions += 1
+
+    def set_disk_budget(self, max_disk_mb):
+        """设置磁盘预算（MB），超出部分立即淘汰"""
+        self.max_bytes = int(max_disk_mb * 1024 * 1024)
+        self._load_index()
+        self._evict()
+
+    def get_stats(self):
+        """获取磁盘缓存统计信息"""
+        self._load_index()
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "disk_mb": self.current_bytes / (1024 * 1024),
+            "max_disk_mb": self.max_bytes / (1024 * 1024),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
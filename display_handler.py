@@ -1,11 +1,26 @@
+import time
+
 from PyQt5.QtGui import QPixmap, QPainter
 from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QApplication
+
+from render_cache import RenderCache
+from render_worker import PRIORITY_DRAFT
+from tile_renderer import SheetTileRenderer
+from tracing import tracer
 
 class DisplayHandler:
     """处理页面显示的类 v2.0"""
+
+    # 提交到后台渲染工作池的任务标签
+    RENDER_TAG = "display"
+    DRAFT_TAG = "draft"
+    # 草稿的渲染分辨率为完整渲染的 1/DRAFT_DIVISOR
+    DRAFT_DIVISOR = 4
+    # 显示尺寸超过该设备像素数的页面（组）按图块渲染，只渲染视口中可见的部分
+    TILED_MIN_PIXELS = 4 * 1024 * 1024
     
-    def __init__(self, page_label, pdf_handler, scaling_handler, page_size_handler, layout_handler, scroll_area):
+    def __init__(self, page_label, pdf_handler, scaling_handler, page_size_handler, layout_handler, scroll_area,
+                 sheet_cache_memory_mb=128):
         self.page_label = page_label
         self.pdf_handler = pdf_handler
         self.scaling_handler = scaling_handler
@@ -13,144 +28,291 @@ class DisplayHandler:
         self.layout_handler = layout_handler
         self.scroll_area = scroll_area # Assign scroll_area here
         self.display_scale_factor = 1.0 # New attribute for display-specific scaling
+        self.render_pool = None # 可选的后台渲染工作池 (RenderWorkerPool)
+        self._pending_page = None # 正在等待后台渲染的页面
+        self._pending_keys = set()
+        self._draft_keys = set() # 正在等待后台渲染的草稿页面
+        self.last_draft_ms = 0.0 # 最近一次合成草稿的用时（毫秒）
+        # 合成后的页面（组）缓存，与页面渲染缓存分开计算预算和淘汰；
+        # 返回已显示过的页面或切换适应窗口时直接显示，不再重新合成
+        self.sheet_cache = RenderCache(sheet_cache_memory_mb)
+        # 超大页面（组）的图块渲染器，page_label 为 TiledPageLabel 时使用
+        self.tile_renderer = SheetTileRenderer(self._draw_sheet)
 
-    def display_single_page(self, current_page):
-        # 获取页面原始尺寸 (以点为单位)
-        pdf_width_pts, pdf_height_pts = self.pdf_handler.get_page_size(current_page)
+    def set_render_pool(self, render_pool):
+        """设置后台渲染工作池，未缓存的页面将在后台渲染（先显示草稿）"""
+        self.render_pool = render_pool
+        render_pool.page_rendered.connect(self._on_page_rendered)
 
-        # 获取输出页面尺寸 (例如A4, Letter) 在点为单位
-        output_page_width_pts, output_page_height_pts = self.page_size_handler.get_page_size_points()
-        print(f"[display_single_page] Initial output_page_pts: {output_page_width_pts}x{output_page_height_pts}, Orientation: {self.page_size_handler.page_orientation}")
-        
-        # 根据页面方向调整输出页面尺寸 (仍然是点为单位)
-        output_page_width_pts, output_page_height_pts = \
-            self.page_size_handler.adjust_dimensions_for_orientation(
-                output_page_width_pts, output_page_height_pts, pdf_width_pts, pdf_height_pts)
-        print(f"[display_single_page] Adjusted output_page_pts: {output_page_width_pts}x{output_page_height_pts}")
-        
-        # 将调整后的输出页面尺寸从点转换为像素 (使用96 DPI)
-        output_page_width_px = int(output_page_width_pts * (96/72))
-        output_page_height_px = int(output_page_height_pts * (96/72))
-        print(f"[display_single_page] Final output_page_px: {output_page_width_px}x{output_page_height_px}")
+    def cancel_pending_render(self):
+        """取消尚未完成的后台渲染和草稿（用户已切换到其他页面或设置）"""
+        self._pending_page = None
+        self._pending_keys = set()
+        self._draft_keys = set()
+        if self.render_pool is not None:
+            self.render_pool.cancel(self.RENDER_TAG)
+            self.render_pool.cancel(self.DRAFT_TAG)
+
+    def _on_page_rendered(self, key):
+        """后台渲染完成一页；草稿页面就绪后更新草稿，完整渲染全部就绪后再合成显示"""
+        if self._pending_page is None:
+            return
+        if key in self._draft_keys:
+            self._draft_keys.discard(key)
+            if self._pending_keys:
+                self.show_draft(self._pending_page)
+            return
+        if key not in self._pending_keys:
+            return
+        self._pending_keys.discard(key)
+        if not self._pending_keys:
+            current_page = self._pending_page
+            self._pending_page = None
+            self._draft_keys = set()
+            self.render_pool.cancel(self.DRAFT_TAG)
+            if self.layout_handler.adaptive_mode:
+                self.display_adaptive_pages(current_page, background=False)
+            else:
+                self.display_single_page(current_page, background=False)
+
+    def _start_background_render(self, current_page):
+        """有未缓存的页面时交给后台渲染进程并先显示草稿，返回False表示应同步渲染
+
+        草稿页面以完整渲染 1/DRAFT_DIVISOR 的分辨率、更高的优先级渲染；草稿只用渲染缓存中已有的结果合成，
+        不调用fitz渲染，因此可以在切换页面后立即显示。
+        """
+        if self.render_pool is None:
+            return False
+        keys = self.get_render_keys(current_page)
+        missing = [key for key in keys if not self.pdf_handler.has_rendered(key)]
+        if not missing or not all([self.render_pool.submit(key, tag=self.RENDER_TAG, persist=True) for key in missing]):
+            return False
+        self._pending_page = current_page
+        self._pending_keys = set(missing)
+        # DPI被限制在上下限时草稿与完整渲染的键可能相同，这些键只作为完整渲染等待
+        draft_keys = [key for key in self.get_render_keys(current_page, 1.0 / self.DRAFT_DIVISOR)
+                      if key not in self._pending_keys and not self.pdf_handler.has_rendered(key)]
+        self._draft_keys = {key for key in draft_keys
+                            if self.render_pool.submit(key, priority=PRIORITY_DRAFT, tag=self.DRAFT_TAG)}
+        self.show_draft(current_page)
+        return True
+
+    def clear_sheet_cache(self):
+        """清空合成页面缓存和图块缓存（加载新文档时调用）"""
+        self.sheet_cache.clear()
+        self.tile_renderer.clear()
+
+    def get_display_size(self, current_page):
+        """获取页面（组）在屏幕上显示的像素尺寸（自然尺寸乘以显示缩放因子）"""
+        natural_width, natural_height = self.get_natural_display_size(current_page)
+        return (max(1, int(natural_width * self.display_scale_factor)),
+                max(1, int(natural_height * self.display_scale_factor)))
+
+    def get_device_pixel_ratio(self):
+        """显示页面的屏幕的设备像素比（高DPI屏幕上大于1）"""
+        return self.page_label.devicePixelRatioF()
 
-        # 创建一个QPixmap作为输出页面，用于绘制PDF内容
-        output_pixmap = QPixmap(output_page_width_px, output_page_height_px)
-        output_pixmap.fill(Qt.white) # 填充白色背景
+    def get_device_scale(self):
+        """自然尺寸（96 DPI）逻辑单位到屏幕设备像素的比例（显示缩放因子乘以设备像素比）"""
+        return self.display_scale_factor * self.get_device_pixel_ratio()
 
-        painter = QPainter(output_pixmap)
+    def _create_sheet_pixmap(self, current_page):
+        """按最终屏幕尺寸创建合成页面（组）的位图和绘图设备
+
+        显示缩放因子和设备像素比直接计入渲染尺寸，合成一次即为屏幕上的实际像素，
+        不再先按96 DPI合成再缩放；painter的逻辑坐标仍为96 DPI的自然尺寸。
+        """
+        width, height = self.get_display_size(current_page)
+        device_pixel_ratio = self.get_device_pixel_ratio()
+        pixmap = QPixmap(max(1, round(width * device_pixel_ratio)), max(1, round(height * device_pixel_ratio)))
+        pixmap.setDevicePixelRatio(device_pixel_ratio)
+        pixmap.fill(Qt.white)
+
+        painter = QPainter(pixmap)
         painter.setRenderHint(QPainter.Antialiasing, True)
         painter.setRenderHint(QPainter.TextAntialiasing, True)
         painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        if abs(self.display_scale_factor - 1.0) > 1e-6:
+            painter.scale(self.display_scale_factor, self.display_scale_factor)
+        return pixmap, painter
 
-        # 渲染原始PDF页面为96DPI的QPixmap
-        pdf_page_img = self.pdf_handler.render_page(current_page, dpi=96)
-        if not pdf_page_img:
-            painter.end()
-            return
+    def is_tiled(self, current_page):
+        """页面（组）是否按图块显示（显示尺寸超过阈值时）"""
+        if not hasattr(self.page_label, "set_tile_renderer"):
+            return False
+        width, height = self.get_display_size(current_page)
+        device_pixel_ratio = self.get_device_pixel_ratio()
+        return width * height * device_pixel_ratio * device_pixel_ratio > self.TILED_MIN_PIXELS
 
-        # 计算内容缩放因子 (用户在UI中设置的缩放)
-        content_scale_factor = self.scaling_handler.scale_factor
+    def _draw_sheet(self, painter, current_page, clip_rect=None, draft=False):
+        """在96 DPI自然尺寸的逻辑坐标中绘制页面（组）
 
-        # 计算将原始PDF内容（在96DPI下）缩放到输出页面尺寸所需的比例
-        scale_x_to_output = (output_page_width_px / pdf_page_img.width()) * content_scale_factor
-        scale_y_to_output = (output_page_height_px / pdf_page_img.height()) * content_scale_factor
-        
-        # 保持纵横比，并留一些边距
-        final_content_scale = min(scale_x_to_output, scale_y_to_output) * 0.9
+        clip_rect 不为None时只绘制与其相交的部分；draft 为True时只用渲染缓存中已有的结果绘制草稿。
+        """
+        target_width, target_height = self.get_natural_display_size(current_page)
+        if self.layout_handler.adaptive_mode:
+            # 计算当前组实际的页面数量（不超过剩余页面数）
+            remaining_pages = self.pdf_handler.get_page_count() - current_page
+            page_count = min(self.layout_handler.pages_per_sheet, remaining_pages)
+            self.layout_handler.draw_adaptive_pages(
+                painter, self.pdf_handler, self.scaling_handler,
+                target_width, target_height, current_page, page_count, clip_rect, draft)
+            return
 
-        painter.save()
-        
-        # 移动到输出页面中心
-        center_x = output_page_width_px / 2
-        center_y = output_page_height_px / 2
-        painter.translate(center_x, center_y)
-        
-        # 应用旋转
-        painter.rotate(self.scaling_handler.rotation_angle)
-        
-        # 应用内容缩放
-        painter.scale(final_content_scale, final_content_scale)
-        
-        # 绘制图像 (现在图像的中心在(0,0)，需要平移回图像的左上角)
-        painter.drawPixmap(int(-pdf_page_img.width() / 2), int(-pdf_page_img.height() / 2), pdf_page_img)
-        
-        painter.restore()
-        painter.end()
+        # 单页模式：页面居中，按输出页面尺寸缩放（留一些边距），旋转在fitz渲染矩阵中完成
+        points_to_output = self._get_single_page_scale(current_page, target_width, target_height)
+        if points_to_output is None:
+            return
+        self.layout_handler.draw_page_centered(
+            painter, self.pdf_handler, current_page, points_to_output, self.scaling_handler.rotation_angle,
+            target_width / 2, target_height / 2, clip_rect, draft)
+
+    def _show_tiles(self, current_page, sheet_key):
+        """按图块显示页面（组）：标签只绘制滚动区域中可见的图块"""
+        width, height = self.get_display_size(current_page)
+        self.tile_renderer.set_sheet(sheet_key, current_page, width, height,
+                                     self.display_scale_factor, self.get_device_pixel_ratio())
+        self.page_label.set_tile_renderer(self.tile_renderer)
+        self.page_label.setFixedSize(width, height)
+        self._update_scroll_area()
 
-        # 应用显示缩放因子
-        if self.display_scale_factor != 1.0:
-            scaled_width = int(output_pixmap.width() * self.display_scale_factor)
-            scaled_height = int(output_pixmap.height() * self.display_scale_factor)
-            output_pixmap = output_pixmap.scaled(scaled_width, scaled_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    def _show_pixmap(self, pixmap):
+        # 显示合成的图像；位图带有设备像素比，标签按逻辑尺寸显示
+        with tracer.span("show"):
+            self.page_label.setPixmap(pixmap)
+            self.page_label.setFixedSize(pixmap.size() / pixmap.devicePixelRatioF())
+            self._update_scroll_area()
 
-        # 设置标签大小以适应图像
-        self.page_label.setPixmap(output_pixmap)
+    def _update_scroll_area(self):
         # Force layout update for scroll area
         self.page_label.adjustSize() # Adjust size of the label itself
         self.scroll_area.widget().adjustSize() # Adjust size of the widget inside scroll area
         self.scroll_area.updateGeometry() # Request a layout update for the scroll area
-        
-        # Force Qt to process events immediately
-        QApplication.processEvents()
 
-    def display_adaptive_pages(self, current_page):
-        # 获取页面原始尺寸 (以点为单位)
-        pdf_width_pts, pdf_height_pts = self.pdf_handler.get_page_size(current_page)
+    def get_sheet_cache_key(self, current_page):
+        """合成页面缓存键：影响合成结果的全部设置和最终像素尺寸"""
+        adaptive_mode = self.layout_handler.adaptive_mode
+        return (self.pdf_handler.file_path,
+                adaptive_mode,
+                current_page,
+                self.layout_handler.pages_per_sheet if adaptive_mode else 1,
+                self.page_size_handler.page_size,
+                self.page_size_handler.page_orientation,
+                self.scaling_handler.scale_factor,
+                self.scaling_handler.rotation_angle,
+                self.get_display_size(current_page),
+                self.get_device_pixel_ratio())
 
-        # 获取输出页面尺寸 (例如A4, Letter) 在点为单位
-        output_page_width_pts, output_page_height_pts = self.page_size_handler.get_page_size_points()
-        print(f"[display_adaptive_pages] Initial output_page_pts: {output_page_width_pts}x{output_page_height_pts}, Orientation: {self.page_size_handler.page_orientation}")
-        
-        # 根据页面方向调整输出页面尺寸 (仍然是点为单位)
-        adjusted_output_width_pts, adjusted_output_height_pts = \
-            self.page_size_handler.adjust_dimensions_for_orientation(
-                output_page_width_pts, output_page_height_pts, pdf_width_pts, pdf_height_pts)
-        print(f"[display_adaptive_pages] Adjusted output_page_pts: {adjusted_output_width_pts}x{adjusted_output_height_pts}")
-        
-        # 将调整后的输出页面尺寸从点转换为像素 (使用96 DPI)
-        target_width = int(adjusted_output_width_pts * (96/72))
-        target_height = int(adjusted_output_height_pts * (96/72))
-        print(f"[display_adaptive_pages] Final target_px: {target_width}x{target_height}")
-        
-        # 创建一个大的pixmap来容纳页面
-        combined_img = QPixmap(target_width, target_height)
-        combined_img.fill(Qt.white)
-        
-        # 创建绘图设备
-        painter = QPainter(combined_img)
-        painter.setRenderHint(QPainter.Antialiasing, True)
-        painter.setRenderHint(QPainter.TextAntialiasing, True)
-        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
-        
-        # 计算当前组实际的页面数量（不超过剩余页面数）
-        remaining_pages = self.pdf_handler.get_page_count() - current_page
-        page_count = min(self.layout_handler.pages_per_sheet, remaining_pages)
-        
-        # 使用布局处理器绘制自适应页面
-        self.layout_handler.draw_adaptive_pages(\
-            painter, self.pdf_handler, self.scaling_handler, \
-            target_width, target_height, current_page, page_count)
-        
-        # 结束绘制
+    def show_draft(self, current_page):
+        """用渲染缓存中已有的结果（任意DPI，缩放绘制）合成草稿；一页都没有时显示占位图"""
+        start_time = time.perf_counter()
+        keys = self.get_render_keys(current_page)
+        if not any(self.pdf_handler.get_best_cached_image(key[0], key[2]) for key in keys):
+            self.show_placeholder(current_page)
+            return
+        with tracer.span("compose", "draft", page=current_page):
+            draft_img, painter = self._create_sheet_pixmap(current_page)
+            self._draw_sheet(painter, current_page, draft=True)
+            painter.end()
+        self._show_pixmap(draft_img)
+        self.last_draft_ms = (time.perf_counter() - start_time) * 1000
+
+    def show_placeholder(self, current_page):
+        """显示廉价的占位图（空白页面和提示文字），等待后台渲染完成"""
+        width, height = self.get_display_size(current_page)
+
+        placeholder = QPixmap(width, height)
+        placeholder.fill(Qt.white)
+        painter = QPainter(placeholder)
+        painter.setPen(Qt.lightGray)
+        painter.drawRect(0, 0, width - 1, height - 1)
+        painter.drawText(placeholder.rect(), Qt.AlignCenter, "正在渲染...")
         painter.end()
+
+        self.page_label.setPixmap(placeholder)
+        self.page_label.setFixedSize(width, height)
+
+    def _get_single_page_scale(self, current_page, output_width, output_height):
+        """计算单页模式下每个PDF点对应的输出像素数（考虑用户缩放，保持纵横比，并留一些边距）"""
+        pdf_width_pts, pdf_height_pts = self.pdf_handler.get_page_size(current_page)
+        if pdf_width_pts <= 0 or pdf_height_pts <= 0:
+            return None
+        return min(output_width / pdf_width_pts,
+                   output_height / pdf_height_pts) * self.scaling_handler.scale_factor * 0.9
+
+    def get_render_keys(self, current_page, quality=1.0):
+        """获取显示指定页面（或页面组）所需的全部页面渲染缓存键（quality小于1时为草稿的渲染键）"""
+        target_width, target_height = self.get_natural_display_size(current_page)
+        if self.layout_handler.adaptive_mode:
+            remaining_pages = self.pdf_handler.get_page_count() - current_page
+            page_count = min(self.layout_handler.pages_per_sheet, remaining_pages)
+            return self.layout_handler.get_sheet_render_keys(
+                self.pdf_handler, self.scaling_handler, target_width, target_height, current_page, page_count,
+                self.get_device_scale() * quality)
+
+        points_to_output = self._get_single_page_scale(current_page, target_width, target_height)
+        if points_to_output is None:
+            return []
+        dpi = self.layout_handler.calculate_render_dpi(points_to_output, self.get_device_scale() * quality)
+        return [self.pdf_handler.make_cache_key(current_page, dpi, self.scaling_handler.rotation_angle)]
+
+    def display_single_page(self, current_page, background=True):
+        self.cancel_pending_render()
+
+        sheet_key = self.get_sheet_cache_key(current_page)
+        output_pixmap = self.sheet_cache.get(sheet_key)
+        if output_pixmap is not None:
+            self._show_pixmap(output_pixmap)
+            return
+
+        # 超大页面按图块渲染，只渲染视口中可见的部分
+        if self.is_tiled(current_page):
+            self._show_tiles(current_page, sheet_key)
+            return
+
+        # 页面未缓存时交给后台渲染进程，先显示草稿
+        if background and self._start_background_render(current_page):
+            return
+
+        # 创建一个QPixmap作为输出页面，用于绘制PDF内容（按最终屏幕尺寸，填充白色背景）
+        with tracer.span("compose", "display_single_page", page=current_page):
+            output_pixmap, painter = self._create_sheet_pixmap(current_page)
+            self._draw_sheet(painter, current_page)
+            painter.end()
+
+        self.sheet_cache.put(sheet_key, output_pixmap)
+        self._show_pixmap(output_pixmap)
+
+    def display_adaptive_pages(self, current_page, background=True):
+        # 已合成过的页面（组）直接显示
+        self.cancel_pending_render()
+        sheet_key = self.get_sheet_cache_key(current_page)
+        combined_img = self.sheet_cache.get(sheet_key)
+        if combined_img is not None:
+            self._show_pixmap(combined_img)
+            return
+
+        # 超大页面（组）按图块渲染，只渲染视口中可见的部分
+        if self.is_tiled(current_page):
+            self._show_tiles(current_page, sheet_key)
+            return
+
+        # 有未缓存的页面时交给后台渲染进程并先显示草稿，全部就绪后再合成，避免阻塞界面
+        if background and self._start_background_render(current_page):
+            return
         
-        # 应用显示缩放因子
-        if self.display_scale_factor != 1.0:
-            scaled_width = int(combined_img.width() * self.display_scale_factor)
-            scaled_height = int(combined_img.height() * self.display_scale_factor)
-            combined_img = combined_img.scaled(scaled_width, scaled_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-
-        # 显示组合图像
-        self.page_label.setPixmap(combined_img)
-        self.page_label.setFixedSize(combined_img.width(), combined_img.height())
-        
-        # Force layout update for scroll area
-        self.page_label.adjustSize() # Adjust size of the label itself
-        self.scroll_area.widget().adjustSize() # Adjust size of the widget inside scroll area
-        self.scroll_area.updateGeometry() # Request a layout update for the scroll area
-        
-        # Force Qt to process events immediately
-        QApplication.processEvents()
+        with tracer.span("compose", "display_adaptive_pages", page=current_page):
+            # 按最终屏幕尺寸创建容纳页面的pixmap和绘图设备
+            combined_img, painter = self._create_sheet_pixmap(current_page)
+
+            # 使用布局处理器绘制自适应页面
+            self._draw_sheet(painter, current_page)
+
+            # 结束绘制
+            painter.end()
+
+        self.sheet_cache.put(sheet_key, combined_img)
+        self._show_pixmap(combined_img)
 
     def get_natural_display_size(self, current_page):
         # 获取页面原始尺寸 (以点为单位)
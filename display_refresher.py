@@ -9,20 +9,48 @@ class DisplayRefresher:
         self.layout_handler = layout_handler
         self.display_handler = display_handler
         self.print_handler = print_handler
+        self.prefetcher = None # 可选的相邻页面预取器 (SheetPrefetcher)
+        self.continuous_view = None # 可选的连续滚动视图 (VirtualSheetView)
+        self.continuous_mode = False
         
     def refresh_display(self, current_page, display_scale_factor=1.0):
         # Set the display_scale_factor in display_handler
         self.display_handler.display_scale_factor = display_scale_factor
 
         if self.pdf_handler.get_page_count() == 0:
+            self.display_handler.cancel_pending_render()
             self.display_handler.page_label.clear()
             return
 
+        if self.continuous_mode and self.continuous_view is not None:
+            self._refresh_continuous(current_page, display_scale_factor)
+            return
+
+        if self.prefetcher is not None:
+            self.prefetcher.record_display(current_page)
+
         if self.layout_handler.adaptive_mode:
             self.display_handler.display_adaptive_pages(current_page)
         else:
             self.display_handler.display_single_page(current_page)
+
+        # 显示之后再预取相邻页面，预取任务优先级低于当前页面
+        if self.prefetcher is not None:
+            self.prefetcher.prefetch_around(current_page)
                 
+    def _refresh_continuous(self, current_page, display_scale_factor):
+        """连续滚动模式：更新视图的缩放并滚动到当前页面所在的重排页面"""
+        self.display_handler.cancel_pending_render()
+        view = self.continuous_view
+        view.refresh()
+        # 与单页显示一致：纸张按96 DPI显示，再乘以显示缩放
+        zoom = 96 / 72.0 * display_scale_factor
+        if view.fit_width or abs(view.zoom - zoom) > 1e-6:
+            view.set_zoom(zoom)
+        sheet_index = current_page // self.layout_handler.pages_per_sheet
+        if sheet_index != view.get_current_sheet():
+            view.scroll_to_sheet(sheet_index)
+
     def refresh_all(self, current_page=0):
         """刷新所有相关组件"""
         # 刷新显示
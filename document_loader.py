@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+
+from pdf_handler import PDFHandler
+from thumbnail_cache import get_default_cache_dir
+
+
+# startxref 指向的位置应该是交叉引用表（"xref"）或交叉引用流对象（"N G obj"）
+_XREF_STREAM_PATTERN = re.compile(rb"\s*\d+\s+\d+\s+obj")
+_STARTXREF_PATTERN = re.compile(rb"startxref\s+(\d+)")
+
+# 打开进程中的PDF处理器（用于在后台建立几何表）
+_worker_pdf_handler = None
+
+
+def needs_repair(file_path, tail_size=2048):
+    """快速检查文件末尾的startxref是否指向交叉引用表
+
+    只读取文件末尾和交叉引用表开头的几十个字节；检查不通过的文件在打开时会被fitz重建
+    交叉引用表（对大文件非常慢），应交给后台进程打开。
+    """
+    with open(file_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        f.seek(max(0, file_size - tail_size))
+        matches = _STARTXREF_PATTERN.findall(f.read())
+        if not matches:
+            return True
+        offset = int(matches[-1])
+        if offset <= 0 or offset >= file_size:
+            return True
+        f.seek(offset)
+        head = f.read(32)
+    return not (head.lstrip().startswith(b"xref") or _XREF_STREAM_PATTERN.match(head))
+
+
+def _repair_in_worker(file_path, repaired_path):
+    """在后台进程中打开需要修复的文件，并把修复后的文档保存为副本，返回页面数"""
+    document = fitz.open(file_path)
+    try:
+        page_count = len(document)
+        temp_path = f"{repaired_path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(repaired_path), exist_ok=True)
+        document.save(temp_path)
+        os.replace(temp_path, repaired_path)
+        return page_count
+    finally:
+        document.close()
+
+
+def _read_geometry_in_worker(file_path):
+    """在后台进程中建立文档几何表，返回可跨进程传递的数组字节"""
+    global _worker_pdf_handler
+    if _worker_pdf_handler is None:
+        _worker_pdf_handler = PDFHandler(cache_memory_mb=0, display_list_cache_size=0)
+    if not _worker_pdf_handler.load_pdf(file_path):
+        raise RuntimeError(f"无法加载PDF文件: {file_path}")
+    try:
+        return (_worker_pdf_handler.page_widths.tobytes(),
+                _worker_pdf_handler.page_heights.tobytes(),
+                _worker_pdf_handler.page_rotations.tobytes())
+    finally:
+        _worker_pdf_handler.close()
+
+
+class DocumentLoader(QObject):
+    """在不阻塞界面的情况下打开PDF文档 v2.0
+
+    交叉引用表完好的文件直接以内存映射方式打开（fitz按需读取对象，页面0立即可用），
+    大文档的几何表在后台进程中建立；交叉引用表损坏的文件由后台进程修复并保存副本，
+    再打开副本（下次打开同一文件时直接使用副本）。
+    """
+
+    # 页面数超过该值时在后台建立几何表
+    BACKGROUND_GEOMETRY_PAGES = 1000
+
+    # 文档已打开（pdf_handler中已是新文档），参数为用户选择的文件路径
+    opened = pyqtSignal(str)
+    # 无法打开文档，参数为文件路径和错误信息
+    failed = pyqtSignal(str, str)
+    # 内部信号：把执行器线程中完成的任务转交给GUI线程处理
+    _job_done = pyqtSignal(object, object)
+
+    def __init__(self, pdf_handler, repair_dir=None, max_repaired=4, parent=None):
+        super().__init__(parent)
+        self.pdf_handler = pdf_handler
+        self.repair_dir = repair_dir or get_default_cache_dir("repaired")
+        self.max_repaired = max_repaired
+        self._executor = None
+        self._generation = 0
+        self._job_done.connect(self._on_job_done, Qt.QueuedConnection)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _get_repaired_path(self, file_path):
+        stat = os.stat(file_path)
+        text = f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+        name = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.repair_dir, f"{name}.pdf")
+
+    def _prune_repaired(self):
+        """只保留最近使用的 max_repaired 个修复副本"""
+        if not os.path.isdir(self.repair_dir):
+            return
+        entries = [entry for entry in os.scandir(self.repair_dir) if entry.name.endswith(".pdf")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[self.max_repaired:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def open(self, file_path):
+        """打开文档；结果通过 opened / failed 信号通知（交叉引用表完好时在返回前发出）"""
+        self._generation += 1
+        try:
+            damaged = needs_repair(file_path)
+            repaired_path = self._get_repaired_path(file_path) if damaged else None
+        except OSError as e:
+            self.failed.emit(file_path, str(e))
+            return
+
+        if not damaged:
+            self._finish_open(file_path, file_path)
+        elif os.path.exists(repaired_path):
+            os.utime(repaired_path)
+            self._finish_open(file_path, repaired_path)
+        else:
+            logging.info(f"交叉引用表损坏，在后台修复: {file_path}")
+            self._submit("repair", (file_path, repaired_path), _repair_in_worker, file_path, repaired_path)
+
+    def _submit(self, stage, context, function, *args):
+        job = (self._generation, stage, context)
+        try:
+            future = self._get_executor().submit(function, *args)
+        except RuntimeError as e:
+            self._executor = None
+            self._job_done.emit(job, e)
+            return
+        future.add_done_callback(lambda f: self._job_done.emit(job, f))
+
+    def _finish_open(self, file_path, open_path):
+        if not self.pdf_handler.load_pdf(open_path, build_geometry=False):
+            self.failed.emit(file_path, "无法加载PDF文件")
+            return
+        if self.pdf_handler.get_page_count() > self.BACKGROUND_GEOMETRY_PAGES:
+            self._submit("geometry", open_path, _read_geometry_in_worker, open_path)
+        else:
+            self.pdf_handler.build_geometry()
+        self.opened.emit(file_path)
+
+    def _on_job_done(self, job, future):
+        generation, stage, context = job
+        if generation != self._generation:
+            return  # 已经打开了其他文件
+        try:
+            if isinstance(future, Exception):
+                raise future
+            result = future.result()
+        except Exception as e:
+            if stage == "repair":
+                self.failed.emit(context[0], str(e))
+            else:
+                # 几何表建立失败时页面尺寸继续按需逐页读取
+                logging.warning(f"无法在后台建立几何表: {str(e)}")
+            return
+
+        if stage == "repair":
+            file_path, repaired_path = context
+            self._prune_repaired()
+            self._finish_open(file_path, repaired_path)
+        elif stage == "geometry" and self.pdf_handler.file_path == context:
+            widths, heights, rotations = (array(typecode) for typecode in "ddH")
+            widths.frombytes(result[0])
+            heights.frombytes(result[1])
+            rotations.frombytes(result[2])
+            self.pdf_handler.set_geometry(widths, heights, rotations)
+
+    def shutdown(self):
+        """结束后台进程"""
+        self._generation += 1
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,97 @@
+import os
+import time
+
+import fitz  # PyMuPDF
+
+from tracing import tracer
+
+
+class ImpositionHandler:
+    """以矢量方式（不栅格化）生成多页合一PDF的类 v2.0"""
+
+    def __init__(self, page_size_handler, layout_handler, scaling_handler):
+        self.page_size_handler = page_size_handler
+        self.layout_handler = layout_handler
+        self.scaling_handler = scaling_handler
+
+    def get_sheet_size_points(self, pdf_handler):
+        """获取输出纸张尺寸（点），与打印时的方向处理一致"""
+        width, height = self.page_size_handler.get_page_size_points()
+        pdf_width, pdf_height = pdf_handler.get_page_size(0)
+        return self.page_size_handler.adjust_dimensions_for_orientation(width, height, pdf_width, pdf_height)
+
+    def _get_target_rect(self, pdf_handler, page_index, x, y, cell_width, cell_height):
+        """计算源页面在单元格中的目标矩形（与LayoutHandler的栅格绘制一致：居中、保持纵横比、应用用户缩放）"""
+        pdf_width, pdf_height = pdf_handler.get_page_size(page_index)
+        if pdf_width <= 0 or pdf_height <= 0:
+            return None
+        scale = min(cell_width / pdf_width, cell_height / pdf_height) * self.scaling_handler.scale_factor
+        width, height = pdf_width * scale, pdf_height * scale
+        if self.scaling_handler.rotation_angle % 180:
+            width, height = height, width
+
+        center_x = x + cell_width / 2
+        center_y = y + cell_height / 2
+        return fitz.Rect(center_x - width / 2, center_y - height / 2,
+                         center_x + width / 2, center_y + height / 2)
+
+    def impose(self, pdf_handler, output_path, page_indices=None, progress_callback=None):
+        """生成多页合一的PDF文件并保存，返回统计信息
+
+        page_indices 为要输出的源页面索引列表（默认全部），
+        progress_callback(已完成张数, 总张数) 用于报告进度。
+        """
+        start_time = time.perf_counter()
+        if page_indices is None:
+            page_indices = list(range(pdf_handler.get_page_count()))
+        source = pdf_handler.pdf_document
+        rotated_pages = [page_index for page_index in set(page_indices) if pdf_handler.get_page_rotation(page_index)]
+        temporary = None
+        if not source.is_pdf or rotated_pages:
+            # show_pdf_page只接受PDF源文档，其他格式先转换；它也不处理源页面自身的/Rotate
+            # （按未旋转的页面绘制，内容被裁切），在副本中清除/Rotate，改为并入rotate参数
+            temporary = fitz.open("pdf", source.tobytes() if source.is_pdf else source.convert_to_pdf())
+            for page_index in rotated_pages:
+                temporary[page_index].set_rotation(0)
+            source = temporary
+
+        pages_per_sheet = self.layout_handler.pages_per_sheet
+        layout = self.layout_handler._get_layout_info(pages_per_sheet)
+        rows, cols = layout["rows"], layout["cols"]
+        sheet_width, sheet_height = self.get_sheet_size_points(pdf_handler)
+        cell_width, cell_height = self.layout_handler._calculate_cell_dimensions(
+            sheet_width, sheet_height, rows, cols)
+        rotation_angle = self.scaling_handler.rotation_angle
+
+        total_sheets = (len(page_indices) + pages_per_sheet - 1) // pages_per_sheet
+        output = fitz.open()
+        try:
+            for sheet_index in range(total_sheets):
+                with tracer.span("impose", sheet=sheet_index):
+                    sheet = output.new_page(width=sheet_width, height=sheet_height)
+                    group = page_indices[sheet_index * pages_per_sheet:(sheet_index + 1) * pages_per_sheet]
+                    for i, page_index in enumerate(group):
+                        row = i // cols
+                        col = i % cols
+                        x, y = self.layout_handler._calculate_cell_position(cell_width, cell_height, col, row)
+                        rect = self._get_target_rect(pdf_handler, page_index, x, y, cell_width, cell_height)
+                        if rect is not None:
+                            # show_pdf_page的旋转方向为逆时针，与界面中和/Rotate的顺时针旋转相反
+                            rotate = -(rotation_angle + pdf_handler.get_page_rotation(page_index))
+                            sheet.show_pdf_page(rect, source, page_index, rotate=rotate)
+                if progress_callback:
+                    progress_callback(sheet_index + 1, total_sheets)
+
+            with tracer.span("save"):
+                output.save(output_path, garbage=3, deflate=True)
+        finally:
+            output.close()
+            if temporary is not None:
+                temporary.close()
+
+        return {
+            "pages": len(page_indices),
+            "sheets": total_sheets,
+            "seconds": time.perf_counter() - start_time,
+            "file_size": os.path.getsize(output_path),
+        }
@@ -1,9 +1,16 @@
+import math
+
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap, QPainter
 
+from tracing import tracer
+
 
 class LayoutHandler:
     """处理页面布局的类 v2.0"""
+
+    # 渲染DPI上限，防止超大纸张或高缩放时生成过大的位图
+    max_render_dpi = 600
     
     def __init__(self, page_size_handler):
         self.pages_per_sheet = 1
@@ -45,8 +52,12 @@ class LayoutHandler:
         return x, y
     
     def draw_adaptive_pages(self, painter, pdf_handler, scaling_handler, target_width, target_height, 
-                           current_page_index, page_count):
-        """绘制自适应页面布局"""
+                           current_page_index, page_count, clip_rect=None, draft=False):
+        """绘制自适应页面布局
+
+        clip_rect 为painter坐标中的QRectF（分条打印时的当前条带），只渲染并绘制与其相交的部分。
+        draft 为True时只使用渲染缓存中已有的结果（任意DPI）绘制草稿，不调用fitz渲染。
+        """
         # 按照每页页面数分组来处理
         # 计算布局信息（使用固定的每页页面数）
         layout = self._get_layout_info(self.pages_per_sheet)
@@ -69,51 +80,126 @@ class LayoutHandler:
             if i < page_count and current_page_index + i < pdf_handler.get_page_count():
                 # 绘制实际页面
                 self._draw_single_page(painter, pdf_handler, scaling_handler, cell_width, cell_height, 
-                                    x, y, current_page_index + i)
+                                    x, y, current_page_index + i, clip_rect, draft)
             else:
                 # 绘制空白页（只绘制边框或保持空白）
                 # 这里我们选择保持空白，不绘制任何内容
                 pass
     
-    def _draw_single_page(self, painter, pdf_handler, scaling_handler, width, height, x, y, page_index):
+    def get_device_scale(self, painter):
+        """获取painter逻辑坐标到设备像素的缩放比例（包含世界变换和设备像素比）"""
+        transform = painter.combinedTransform()
+        scale = math.sqrt(abs(transform.determinant())) or 1.0
+        return scale * painter.device().devicePixelRatioF()
+
+    def calculate_render_dpi(self, points_to_painter, device_scale=1.0):
+        """根据页面在设备上的最终像素尺寸计算渲染DPI
+
+        points_to_painter 为每个PDF点对应的painter逻辑单位数（已包含用户缩放），
+        device_scale 为painter逻辑单位到设备像素的比例。
+        """
+        dpi = 72.0 * points_to_painter * device_scale
+        return max(1.0, min(dpi, self.max_render_dpi))
+
+    def _get_points_to_cell(self, pdf_handler, scaling_handler, width, height, page_index):
+        """计算页面放入单元格时每个PDF点对应的单元格单位数（考虑用户缩放，保持纵横比）"""
+        pdf_width_pts, pdf_height_pts = pdf_handler.get_page_size(page_index)
+        if pdf_width_pts <= 0 or pdf_height_pts <= 0:
+            return None
+        return min(width / pdf_width_pts, height / pdf_height_pts) * scaling_handler.scale_factor
+
+    def get_sheet_render_keys(self, pdf_handler, scaling_handler, target_width, target_height,
+                              current_page_index, page_count, device_scale=1.0):
+        """获取绘制一张重排页面所需的全部页面渲染缓存键（与draw_adaptive_pages一致）"""
+        layout = self._get_layout_info(self.pages_per_sheet)
+        cell_width, cell_height = self._calculate_cell_dimensions(
+            target_width, target_height, layout["rows"], layout["cols"])
+
+        keys = []
+        for i in range(min(page_count, self.pages_per_sheet)):
+            page_index = current_page_index + i
+            if page_index >= pdf_handler.get_page_count():
+                break
+            points_to_cell = self._get_points_to_cell(pdf_handler, scaling_handler, cell_width, cell_height, page_index)
+            if points_to_cell is None:
+                continue
+            dpi = self.calculate_render_dpi(points_to_cell, device_scale)
+            keys.append(pdf_handler.make_cache_key(page_index, dpi, scaling_handler.rotation_angle))
+        return keys
+    
+    def _draw_single_page(self, painter, pdf_handler, scaling_handler, width, height, x, y, page_index,
+                          clip_rect=None, draft=False):
         """绘制单个页面"""
         # 检查页面索引是否有效
         if page_index >= pdf_handler.get_page_count():
             return
-        
-        # 渲染页面为Pixmap (以固定DPI，例如96 DPI)
-        # 这里的img是原始PDF页面在96DPI下的渲染结果，不包含用户缩放和旋转
-        img = pdf_handler.render_page(page_index, dpi=96)
-        if not img:
+
+        # 计算将原始PDF内容（以点为单位）缩放到单元格大小所需的比例
+        # 考虑用户缩放因子，保持纵横比
+        points_to_cell = self._get_points_to_cell(pdf_handler, scaling_handler, width, height, page_index)
+        if points_to_cell is None:
             return
-        
-        # 计算内容缩放因子 (用户在UI中设置的缩放)
-        content_scale_factor = scaling_handler.scale_factor
 
-        # 计算将原始PDF内容（在96DPI下）缩放到单元格大小所需的比例
-        # 考虑用户缩放因子
-        scale_x_to_cell = (width / img.width()) * content_scale_factor
-        scale_y_to_cell = (height / img.height()) * content_scale_factor
-        
-        # 保持纵横比，并留一些边距
-        final_content_scale = min(scale_x_to_cell, scale_y_to_cell)
+        # 移动到单元格中心绘制
+        self.draw_page_centered(painter, pdf_handler, page_index, points_to_cell, scaling_handler.rotation_angle,
+                                x + width / 2, y + height / 2, clip_rect, draft)
+
+    def draw_page_centered(self, painter, pdf_handler, page_index, points_to_painter, rotation,
+                           center_x, center_y, clip_rect=None, draft=False):
+        """以 (center_x, center_y) 为中心绘制页面，每个PDF点对应 points_to_painter 个painter逻辑单位
+
+        clip_rect 为painter坐标中的QRectF，只渲染并绘制与其相交的部分（分条打印、分块显示）。
+        draft 为True时用渲染缓存中已有的任意DPI的结果缩放绘制，没有时不绘制。
+        """
+        # 按页面在设备上的实际像素尺寸渲染，避免先以96 DPI渲染再放大
+        # 旋转在fitz渲染矩阵中完成，得到的位图已经是最终方向
+        dpi = self.calculate_render_dpi(points_to_painter, self.get_device_scale(painter))
+
+        # 渲染结果与目标尺寸一致时该比例为设备缩放的倒数，绘制时不需要重采样
+        image_scale = points_to_painter * 72.0 / dpi
+
+        if draft:
+            result = pdf_handler.get_best_cached_image(page_index, rotation)
+            if result is None:
+                return
+            img, dpi = result
+            image_scale = points_to_painter * 72.0 / dpi
+            image_x, image_y = int(-img.width() / 2), int(-img.height() / 2)
+        elif clip_rect is None:
+            img = pdf_handler.render_page_image(page_index, dpi=dpi, rotation=rotation)
+            if not img:
+                return
+            image_x, image_y = int(-img.width() / 2), int(-img.height() / 2)
+        else:
+            # 分条/分块绘制：只用fitz渲染页面与裁剪区域相交的部分
+            bounds = pdf_handler.get_render_bounds(page_index, dpi, rotation)
+            if bounds is None:
+                return
+            full_x, full_y = int(-bounds.width / 2), int(-bounds.height / 2)
+            # 裁剪区域在整页渲染结果中的像素区域（向外扩展1像素，避免条带之间出现缝隙）
+            region = (
+                math.floor((clip_rect.left() - center_x) / image_scale - full_x) - 1,
+                math.floor((clip_rect.top() - center_y) / image_scale - full_y) - 1,
+                math.ceil((clip_rect.right() - center_x) / image_scale - full_x) + 1,
+                math.ceil((clip_rect.bottom() - center_y) / image_scale - full_y) + 1,
+            )
+            result = pdf_handler.render_page_region(page_index, region, dpi=dpi, rotation=rotation)
+            if result is None:
+                return
+            img, offset_x, offset_y = result
+            image_x, image_y = full_x + offset_x, full_y + offset_y
 
         # 保存painter状态
         painter.save()
-        
-        # 移动到单元格中心
-        center_x = x + width / 2
-        center_y = y + height / 2
         painter.translate(center_x, center_y)
         
-        # 应用旋转 (只使用用户设置的旋转角度)
-        painter.rotate(scaling_handler.rotation_angle)
-        
-        # 应用内容缩放
-        painter.scale(final_content_scale, final_content_scale)
+        # 将设备像素映射回逻辑坐标
+        if abs(image_scale - 1.0) > 1e-6:
+            painter.scale(image_scale, image_scale)
         
         # 绘制图像 (现在图像的中心在(0,0)，需要平移回图像的左上角)
-        painter.drawPixmap(int(-img.width() / 2), int(-img.height() / 2), img)
+        with tracer.span("scale", page=page_index):
+            painter.drawImage(image_x, image_y, img)
         
         # 恢复painter状态
-        painter.restore()
\ No newline at end of file
+        painter.restore()
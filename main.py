@@ -1,22 +1,37 @@
 import sys
 import logging
+import multiprocessing
 import tempfile
 import os
-from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox, QLineEdit, QProgressDialog
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox, QLineEdit, QProgressDialog, QShortcut
 from PyQt5.QtCore import Qt, QSize, QTimer
-from PyQt5.QtGui import QPainter, QPageLayout, QPixmap
-from PyQt5.QtPrintSupport import QPrinter, QPrintDialog, QPrintPreviewDialog
+from PyQt5.QtGui import QPageLayout, QKeySequence
+from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
 
 # 导入我们新创建的模块
 from pdf_handler import PDFHandler
+from disk_render_cache import DiskRenderCache
+from document_loader import DocumentLoader
 from scaling_handler import ScalingHandler
 from page_size_handler import PageSizeHandler
 from layout_handler import LayoutHandler
 from print_handler import PrintHandler
 from layout_drawer import LayoutDrawer
+from imposition_handler import ImpositionHandler
+from print_pipeline import PrintPipeline
+from print_preview_dialog import PrintPreviewDialog
+from sheet_renderer import SheetRenderer
+from virtual_sheet_view import VirtualSheetView
+from thumbnail_cache import ThumbnailCache
+from thumbnail_model import ThumbnailModel
 from ui_handler import UIHandler
 from display_handler import DisplayHandler
 from display_refresher import DisplayRefresher
+from render_worker import RenderWorkerPool
+from prefetcher import SheetPrefetcher
+from refresh_scheduler import RefreshScheduler
+from tracing import tracer
+from memory_budget import DEFAULT_BUDGET_MB, MemoryBudget
 
 
 
@@ -26,15 +41,57 @@ class PDFPrinterApp(UIHandler):
         
         # 初始化处理模块
         self.pdf_handler = PDFHandler()
+        # 跨会话的磁盘渲染缓存，再次打开同一文档时不需要重新渲染
+        self.pdf_handler.set_disk_cache(DiskRenderCache())
+        # 以内存映射方式打开文档，损坏的文件和大文档的几何表交给后台进程处理
+        self.document_loader = DocumentLoader(self.pdf_handler, parent=self)
         self.scaling_handler = ScalingHandler()
         self.page_size_handler = PageSizeHandler()
         self.layout_handler = LayoutHandler(self.page_size_handler)
         self.print_handler = PrintHandler()
         self.layout_drawer = LayoutDrawer()
+        self.imposition_handler = ImpositionHandler(self.page_size_handler, self.layout_handler, self.scaling_handler)
+        # 全局内存预算：环境变量 PDF_PRINTER_MEMORY_MB 设置预算（0表示不限制），
+        # PDF_PRINTER_MEMORY_SAMPLING=rss/tracemalloc 时在打印任务期间采样内存峰值
+        self.memory_budget = MemoryBudget(float(os.environ.get("PDF_PRINTER_MEMORY_MB", DEFAULT_BUDGET_MB)),
+                                          os.environ.get("PDF_PRINTER_MEMORY_SAMPLING") or None)
+        self.print_pipeline = PrintPipeline(self.pdf_handler, self.scaling_handler, self.page_size_handler, self.layout_handler,
+                                            memory_budget=self.memory_budget)
         self.display_handler = DisplayHandler(self.page_label, self.pdf_handler, self.scaling_handler, self.page_size_handler, self.layout_handler, self.scroll_area)
         self.display_refresher = DisplayRefresher(
             self.pdf_handler, self.scaling_handler, self.page_size_handler, 
             self.layout_handler, self.display_handler, self.print_handler)
+
+        # 后台渲染进程池，避免在GUI线程中渲染多页布局
+        self.render_pool = RenderWorkerPool(self.pdf_handler, parent=self)
+        self.display_handler.set_render_pool(self.render_pool)
+        self.prefetcher = SheetPrefetcher(
+            self.pdf_handler, self.scaling_handler, self.page_size_handler,
+            self.layout_handler, self.display_handler, self.render_pool)
+        self.display_refresher.prefetcher = self.prefetcher
+
+        # 连续滚动视图：只渲染与视口相交的重排页面
+        self.continuous_renderer = SheetRenderer(
+            self.pdf_handler, self.scaling_handler, self.page_size_handler,
+            self.layout_handler, self.render_pool, render_tag="continuous", parent=self)
+        self.continuous_view = VirtualSheetView(self.continuous_renderer)
+        self.display_stack.addWidget(self.continuous_view)
+        self.display_refresher.continuous_view = self.continuous_view
+
+        # 缩略图栏：低优先级后台渲染，按文件内容哈希保存到磁盘
+        self.thumbnail_model = ThumbnailModel(self.pdf_handler, self.render_pool, ThumbnailCache(), parent=self)
+        self.thumbnail_list.setModel(self.thumbnail_model)
+        self.thumbnail_list.setIconSize(self.thumbnail_model.get_icon_size())
+
+        # 合并连续的刷新请求，只渲染最新的目标
+        self.refresh_scheduler = RefreshScheduler(self.display_refresher, parent=self)
+
+        # 各渲染缓存计入全局内存预算，打印占用超出预算时按比例收缩
+        self.memory_budget.register_cache("pages", self.pdf_handler.render_cache, min_mb=32)
+        self.memory_budget.register_cache("sheets", self.display_handler.sheet_cache, min_mb=16)
+        self.memory_budget.register_cache("tiles", self.display_handler.tile_renderer.cache, min_mb=16)
+        self.memory_budget.register_cache("continuous", self.continuous_renderer.sheet_cache, min_mb=16)
+        self.memory_budget.register_cache("thumbnails", self.thumbnail_model.memory_cache, min_mb=4)
         
         # 初始化变量
         self.current_page = 0
@@ -45,14 +102,20 @@ class PDFPrinterApp(UIHandler):
         
         # 连接信号和槽
         self.load_button.clicked.connect(self.load_pdf)
+        self.document_loader.opened.connect(self.document_opened)
+        self.document_loader.failed.connect(self.document_failed)
         self.print_button.clicked.connect(self.print_pdf)
         self.print_preview_button.clicked.connect(self.print_preview)
+        self.export_button.clicked.connect(self.export_pdf)
         self.fit_to_window_button.clicked.connect(self.fit_to_window)  # 新增连接
         self.zoom_combo.currentIndexChanged.connect(self.zoom_changed)
         self.custom_zoom_input.returnPressed.connect(self.custom_zoom_entered)
         self.rotate_combo.currentIndexChanged.connect(self.rotate_changed)
         self.size_combo.currentIndexChanged.connect(self.size_changed)
         self.adaptive_checkbox.stateChanged.connect(self.adaptive_mode_changed)
+        self.continuous_checkbox.stateChanged.connect(self.continuous_mode_changed)
+        self.continuous_view.current_sheet_changed.connect(self.continuous_sheet_changed)
+        self.thumbnail_list.clicked.connect(self.thumbnail_clicked)
         self.orientation_combo.currentIndexChanged.connect(self.orientation_changed)
         self.pages_per_sheet_combo.currentIndexChanged.connect(self.pages_per_sheet_changed)
         self.prev_button.clicked.connect(self.prev_page)
@@ -62,6 +125,31 @@ class PDFPrinterApp(UIHandler):
         # 安装事件过滤器以处理鼠标滚轮事件
         self.scroll_area.installEventFilter(self)
         self.page_label.installEventFilter(self)
+
+        # 耗时跟踪：设置环境变量 PDF_PRINTER_TRACE=文件路径 时启动即开始跟踪，Ctrl+Shift+T 随时开关，
+        # 关闭跟踪（或退出程序）时导出Chrome跟踪事件文件
+        self.trace_path = os.environ.get("PDF_PRINTER_TRACE") or \
+            os.path.join(tempfile.gettempdir(), "pdf_printer_trace.json")
+        tracer.set_enabled(bool(os.environ.get("PDF_PRINTER_TRACE")))
+        QShortcut(QKeySequence("Ctrl+Shift+T"), self, self.toggle_tracing)
+
+    def toggle_tracing(self):
+        """开始或结束耗时跟踪，结束时导出跟踪文件并记录各阶段汇总"""
+        if not tracer.enabled:
+            tracer.clear()
+            tracer.set_enabled(True)
+            logging.info("耗时跟踪已开始（Ctrl+Shift+T 结束并导出）")
+            return
+        tracer.set_enabled(False)
+        self.export_trace()
+
+    def export_trace(self):
+        """导出已记录的跟踪区间并记录各阶段汇总"""
+        try:
+            count = tracer.export_chrome_trace(self.trace_path)
+            logging.info(f"已导出 {count} 个跟踪区间到 {self.trace_path}\n{tracer.format_summary()}")
+        except OSError as e:
+            logging.error(f"无法导出跟踪文件: {str(e)}")
         
     def fit_to_window(self):
         """适应窗口大小功能 - 控制新PDF页面在GUI窗口中的显示大小，不影响渲染缩放"""
@@ -72,7 +160,7 @@ class PDFPrinterApp(UIHandler):
                 self._calculate_and_apply_fit_to_window_scale()
             else:
                 # If fit to window is deactivated, revert to default display scale (1.0)
-                self.display_refresher.refresh_display(self.current_page, 1.0)
+                self.refresh_scheduler.request(self.current_page, 1.0)
 
     def _calculate_and_apply_fit_to_window_scale(self):
         if self.pdf_handler.get_page_count() > 0:
@@ -85,9 +173,9 @@ class PDFPrinterApp(UIHandler):
                 scale_x = available_width / natural_width
                 scale_y = available_height / natural_height
                 display_scale = min(scale_x, scale_y)
-                self.display_refresher.refresh_display(self.current_page, display_scale)
+                self.refresh_scheduler.request(self.current_page, display_scale)
             else:
-                self.display_refresher.refresh_display(self.current_page, 1.0)
+                self.refresh_scheduler.request(self.current_page, 1.0)
         
     def eventFilter(self, obj, event):
         # 处理鼠标滚轮事件以调整滚动条
@@ -105,42 +193,69 @@ class PDFPrinterApp(UIHandler):
             return True  # 事件已处理
             
         return super().eventFilter(obj, event)
+
+    def closeEvent(self, event):
+        """关闭窗口时结束后台渲染进程"""
+        self.refresh_scheduler.cancel()
+        logging.info(f"预取统计: {self.prefetcher.get_stats()}")
+        logging.info(f"内存统计: {self.memory_budget.get_stats()}")
+        if tracer.enabled:
+            self.export_trace()
+        self.render_pool.shutdown()
+        self.document_loader.shutdown()
+        super().closeEvent(event)
         
     def load_pdf(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "打开PDF文件", "", "PDF Files (*.pdf)")
         if file_path:
-            if self.pdf_handler.load_pdf(file_path):
-                self.current_page = 0
-                
-                # 设置默认缩放为100%
-                self.scaling_handler.set_scale_factor(1.0)
-                self.zoom_combo.setCurrentText("100%")
-                self.custom_zoom_input.setVisible(False)
-                
-                # 根据PDF的固有方向设置页面方向
-                initial_orientation = self.pdf_handler.get_page_orientation(0) # Get orientation of first page
-                self.page_size_handler.set_page_orientation(initial_orientation)
-                
-                # 更新UI中的方向选择
-                # Find the index of the initial_orientation in the combo box data
-                index = self.orientation_combo.findData(initial_orientation)
-                if index != -1:
-                    self.orientation_combo.setCurrentIndex(index)
+            # 需要修复的文件在后台打开，完成后通过 document_opened 显示
+            self.page_info_label.setText("正在打开...")
+            self.document_loader.open(file_path)
 
-                # 刷新显示
-                if self.fit_to_window_active:
-                    self._calculate_and_apply_fit_to_window_scale()
-                else:
-                    self.display_refresher.refresh_display(self.current_page, 1.0)                
-                self.print_button.setEnabled(True)
-                self.print_preview_button.setEnabled(True)
-                self.prev_button.setEnabled(True)
-                self.next_button.setEnabled(True)
-                
-                # 更新页面信息和滚动条
-                self.update_page_info()
-            else:
-                QMessageBox.critical(self, "错误", "无法加载PDF文件")
+    def document_opened(self, file_path):
+        """文档已打开：重置状态并显示第一页（大文档的几何表可能仍在后台建立）"""
+        self.render_pool.reset()
+        self.display_handler.clear_sheet_cache()
+        self.thumbnail_model.reset_document()
+        self.current_page = 0
+            
+        # 设置默认缩放为100%
+        self.scaling_handler.set_scale_factor(1.0)
+        self.zoom_combo.setCurrentText("100%")
+        self.custom_zoom_input.setVisible(False)
+            
+        # 根据PDF的固有方向设置页面方向
+        initial_orientation = self.pdf_handler.get_page_orientation(0) # Get orientation of first page
+        self.page_size_handler.set_page_orientation(initial_orientation)
+            
+        # 更新UI中的方向选择
+        # Find the index of the initial_orientation in the combo box data
+        index = self.orientation_combo.findData(initial_orientation)
+        if index != -1:
+            self.orientation_combo.setCurrentIndex(index)
+
+        # 刷新显示
+        if self.fit_to_window_active:
+            self._calculate_and_apply_fit_to_window_scale()
+        else:
+            self.refresh_scheduler.request(self.current_page, 1.0)                
+        self.print_button.setEnabled(True)
+        self.print_preview_button.setEnabled(True)
+        self.export_button.setEnabled(True)
+        self.prev_button.setEnabled(True)
+        self.next_button.setEnabled(True)
+            
+        # 更新页面信息和滚动条
+        self.update_page_info()
+
+    def document_failed(self, file_path, message):
+        """无法打开文档"""
+        logging.error(f"无法加载PDF文件 {file_path}: {message}")
+        if self.pdf_handler.get_page_count() > 0:
+            self.update_page_info()
+        else:
+            self.page_info_label.setText("第 0 页，共 0 页")
+        QMessageBox.critical(self, "错误", "无法加载PDF文件")
     
     def update_page_info(self):
         """更新页面信息和滚动条"""
@@ -163,6 +278,11 @@ class PDFPrinterApp(UIHandler):
             
             # 更新按钮状态
             self.update_button_state()
+
+            # 在缩略图栏中选中当前页面
+            index = self.thumbnail_model.index(self.current_page)
+            self.thumbnail_list.setCurrentIndex(index)
+            self.thumbnail_list.scrollTo(index)
     
     def update_button_state(self):
         """更新按钮状态"""
@@ -186,7 +306,7 @@ class PDFPrinterApp(UIHandler):
             self.custom_zoom_input.setVisible(False)
             self.scaling_handler.set_scale_factor(zoom_value)
             self.fit_to_window_active = False # Deactivate fit to window
-            self.display_refresher.refresh_display(self.current_page, 1.0)
+            self.refresh_scheduler.request(self.current_page, 1.0)
             # 更新页面信息
             self.update_page_info()
     
@@ -198,7 +318,7 @@ class PDFPrinterApp(UIHandler):
                 # 设置缩放因子（转换为小数形式）
                 self.scaling_handler.set_scale_factor(zoom_value / 100.0)
                 self.fit_to_window_active = False # Deactivate fit to window
-                self.display_refresher.refresh_display(self.current_page, 1.0)
+                self.refresh_scheduler.request(self.current_page, 1.0)
                 # 更新页面信息
                 self.update_page_info()
             else:
@@ -211,7 +331,7 @@ class PDFPrinterApp(UIHandler):
         if self.fit_to_window_active:
             self._calculate_and_apply_fit_to_window_scale()
         else:
-            self.display_refresher.refresh_display(self.current_page, 1.0)
+            self.refresh_scheduler.request(self.current_page, 1.0)
         # 更新页面信息
         self.update_page_info()
     
@@ -221,7 +341,7 @@ class PDFPrinterApp(UIHandler):
         if self.fit_to_window_active:
             self._calculate_and_apply_fit_to_window_scale()
         else:
-            self.display_refresher.refresh_display(self.current_page, 1.0)
+            self.refresh_scheduler.request(self.current_page, 1.0)
         # 更新页面信息
         self.update_page_info()
     
@@ -230,10 +350,49 @@ class PDFPrinterApp(UIHandler):
         if self.fit_to_window_active:
             self._calculate_and_apply_fit_to_window_scale()
         else:
-            self.display_refresher.refresh_display(self.current_page, 1.0)
+            self.refresh_scheduler.request(self.current_page, 1.0)
         # 更新页面信息
         self.update_page_info()
     
+    def thumbnail_clicked(self, index):
+        """点击缩略图：跳转到该页面所在的页面（组）"""
+        page_index = index.row()
+        if self.layout_handler.adaptive_mode or self.display_refresher.continuous_mode:
+            page_index -= page_index % self.layout_handler.pages_per_sheet
+        self.current_page = page_index
+        if self.fit_to_window_active:
+            self._calculate_and_apply_fit_to_window_scale()
+        else:
+            self.refresh_scheduler.request(self.current_page, 1.0)
+        self.update_page_info()
+
+    def continuous_mode_changed(self, state):
+        """切换连续滚动模式"""
+        continuous = state == Qt.Checked
+        self.display_refresher.continuous_mode = continuous
+        if continuous:
+            self.display_handler.cancel_pending_render()
+            self.prefetcher.cancel()
+            self.display_stack.setCurrentWidget(self.continuous_view)
+        else:
+            # 释放连续滚动视图的重排页面图像
+            self.continuous_renderer.cancel()
+            self.continuous_renderer.sheet_cache.clear()
+            self.display_stack.setCurrentWidget(self.scroll_area)
+        if self.fit_to_window_active:
+            self._calculate_and_apply_fit_to_window_scale()
+        else:
+            self.refresh_scheduler.request(self.current_page, 1.0)
+
+    def continuous_sheet_changed(self, sheet_index):
+        """连续滚动视图中的当前重排页面变化时同步页码和滑动条（不触发刷新）"""
+        if not self.display_refresher.continuous_mode:
+            return
+        self.current_page = sheet_index * self.layout_handler.pages_per_sheet
+        self.page_scrollbar.blockSignals(True)
+        self.update_page_info()
+        self.page_scrollbar.blockSignals(False)
+
     def orientation_changed(self, index):
         orientation = self.orientation_combo.currentData()
         self.page_size_handler.set_page_orientation(orientation)
@@ -241,7 +400,7 @@ class PDFPrinterApp(UIHandler):
         if self.fit_to_window_active:
             self._calculate_and_apply_fit_to_window_scale()
         else:
-            self.display_refresher.refresh_display(self.current_page, 1.0)
+            self.refresh_scheduler.request(self.current_page, 1.0)
         # 更新页面信息
         self.update_page_info()
     
@@ -250,7 +409,7 @@ class PDFPrinterApp(UIHandler):
         if self.fit_to_window_active:
             self._calculate_and_apply_fit_to_window_scale()
         else:
-            self.display_refresher.refresh_display(self.current_page, 1.0)
+            self.refresh_scheduler.request(self.current_page, 1.0)
         # 更新页面信息（页面数量可能已改变）
         self.update_page_info()
     
@@ -263,12 +422,12 @@ class PDFPrinterApp(UIHandler):
                 if self.fit_to_window_active:
                     self._calculate_and_apply_fit_to_window_scale()
                 else:
-                    self.display_refresher.refresh_display(self.current_page, 1.0)
+                    self.refresh_scheduler.request(self.current_page, 1.0)
         else:
             # 单页布局的上一页
             if self.current_page > 0:
                 self.current_page -= 1
-                self.display_refresher.refresh_display(self.current_page, 1.0)
+                self.refresh_scheduler.request(self.current_page, 1.0)
         
         # 更新页面信息
         self.update_page_info()
@@ -290,7 +449,7 @@ class PDFPrinterApp(UIHandler):
             if self.fit_to_window_active:
                 self._calculate_and_apply_fit_to_window_scale()
             else:
-                self.display_refresher.refresh_display(self.current_page, 1.0)
+                self.refresh_scheduler.request(self.current_page, 1.0)
             # 更新按钮状态
             self.update_button_state()
     
@@ -304,12 +463,12 @@ class PDFPrinterApp(UIHandler):
                 if self.fit_to_window_active:
                     self._calculate_and_apply_fit_to_window_scale()
                 else:
-                    self.display_refresher.refresh_display(self.current_page, 1.0)
+                    self.refresh_scheduler.request(self.current_page, 1.0)
         else:
             # 单页布局的下一页
             if self.pdf_handler.get_page_count() > 0 and self.current_page < self.pdf_handler.get_page_count() - 1:
                 self.current_page += 1
-                self.display_refresher.refresh_display(self.current_page, 1.0)
+                self.refresh_scheduler.request(self.current_page, 1.0)
         
         # 更新页面信息
         self.update_page_info()
@@ -319,51 +478,43 @@ class PDFPrinterApp(UIHandler):
             # 直接打印
             self._direct_print()
 
+    def export_pdf(self):
+        """按当前布局以矢量方式导出多页合一PDF"""
+        if self.pdf_handler.get_page_count() == 0:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出PDF", "", "PDF Files (*.pdf)")
+        if not file_path:
+            return
+
+        self.print_progress.setVisible(True)
+        self.print_progress.setValue(0)
+
+        def update_progress(done, total):
+            self.print_progress.setRange(0, total)
+            self.print_progress.setValue(done)
+            QApplication.processEvents()  # 确保 UI 更新
+
+        try:
+            stats = self.imposition_handler.impose(self.pdf_handler, file_path, progress_callback=update_progress)
+            self.print_progress.setVisible(False)
+            QMessageBox.information(
+                self, "导出", f"导出完成！共 {stats['sheets']} 张，用时 {stats['seconds']:.1f} 秒，"
+                              f"文件大小 {stats['file_size'] / (1024 * 1024):.1f} MB")
+        except Exception as e:
+            self.print_progress.setVisible(False)
+            logging.error(f"导出PDF时出错: {str(e)}")
+            QMessageBox.critical(self, "导出错误", f"导出PDF时出错: {str(e)}")
+
     def print_preview(self):
-        """打印预览功能"""
+        """打印预览功能（只渲染可见的重排页面）"""
         if self.pdf_handler.get_page_count() > 0:
-            preview_dialog = QPrintPreviewDialog()
-            preview_dialog.paintRequested.connect(self._preview_paint_requested)
+            preview_dialog = PrintPreviewDialog(
+                self.pdf_handler, self.scaling_handler, self.page_size_handler,
+                self.layout_handler, self.render_pool, memory_budget=self.memory_budget, parent=self)
+            preview_dialog.print_requested.connect(self._direct_print)
             preview_dialog.exec_()
-
-    def _preview_paint_requested(self, printer):
-        """处理打印预览的绘制请求"""
-        # 配置打印机
-        self.print_handler.configure_printer(printer)
-        
-        # 开始绘制
-        painter = QPainter(printer)
-        
-        # 获取页面尺寸
-        page_rect = printer.pageRect()
-        target_width = page_rect.width()
-        target_height = page_rect.height()
-        
-        # 根据页面方向调整目标尺寸
-        if self.pdf_handler.get_page_count() > 0:
-            pdf_width, pdf_height = self.pdf_handler.get_page_size(0)
-            target_width, target_height = self.page_size_handler.adjust_dimensions_for_orientation(
-                target_width, target_height, pdf_width, pdf_height)
-        
-        # 绘制页面
-        total_pages = self.pdf_handler.get_page_count()
-        pages_per_sheet = self.layout_handler.pages_per_sheet
-        total_layout_pages = (total_pages + pages_per_sheet - 1) // pages_per_sheet
-        
-        for layout_page_index in range(total_layout_pages):
-            if layout_page_index > 0:
-                printer.newPage()
-            
-            start_pdf_page = layout_page_index * pages_per_sheet
-            remaining_pages = total_pages - start_pdf_page
-            page_count = min(pages_per_sheet, remaining_pages)
-            
-            # 绘制页面（使用缩放）
-            self.layout_handler.draw_adaptive_pages(
-                painter, self.pdf_handler, self.scaling_handler,
-                target_width, target_height, start_pdf_page, page_count)
-        
-        painter.end()
+            # 对话框以主窗口为父对象，不删除时会连同其渲染器一直留在主窗口下
+            preview_dialog.deleteLater()
 
     def _direct_print(self):
         """直接打印功能"""
@@ -387,66 +538,41 @@ class PDFPrinterApp(UIHandler):
             QTimer.singleShot(100, lambda: self._print_pages(printer, total_layout_pages))
 
     def _print_pages(self, printer, total_layout_pages):
-        """实际打印页面"""
+        """实际打印页面（多进程并行栅格化，按顺序送入打印机）"""
         try:
-            page_rect = printer.pageRect()
-
-
-            painter = QPainter(printer)
-
-            total_pages = self.pdf_handler.get_page_count()
-            pages_per_sheet = self.layout_handler.pages_per_sheet
-
-            for layout_page_index in range(total_layout_pages):
+            def update_progress(rendered, spooled):
                 # 更新进度条
-                self.print_progress.setValue(layout_page_index + 1)
+                self.print_progress.setValue(spooled)
+                self.print_progress.setFormat(f"渲染 {rendered}/{total_layout_pages} · 打印 {spooled}/{total_layout_pages}")
                 QApplication.processEvents()  # 确保 UI 更新
 
-                if layout_page_index > 0:
-                    printer.newPage()
-
-                # 使用打印机的pageRect创建pixmap以确保分辨率
-                pixmap = QPixmap(page_rect.size())
+            # 逐条带送入打印机，每张页面只需一个条带大小的栅格缓冲区
+            stats = self.print_pipeline.print_to(printer, total_layout_pages, update_progress)
+            logging.info(f"打印完成: {stats}")
+            if tracer.enabled:
+                logging.info(f"打印各阶段耗时:\n{tracer.format_summary()}")
 
-                pixmap.fill(Qt.white)
-
-                pixmap_painter = QPainter(pixmap)
-                target_width = pixmap.width()
-                target_height = pixmap.height()
-
-                # 根据页面方向调整目标尺寸
-                if self.pdf_handler.get_page_count() > 0:
-                    pdf_width, pdf_height = self.pdf_handler.get_page_size(0)
-                    target_width, target_height = self.page_size_handler.adjust_dimensions_for_orientation(
-                        target_width, target_height, pdf_width, pdf_height)
-
-                start_pdf_page = layout_page_index * pages_per_sheet
-                remaining_pages = total_pages - start_pdf_page
-                page_count = min(pages_per_sheet, remaining_pages)
-
-                # 打印时使用缩放
-                self.layout_handler.draw_adaptive_pages(
-                    pixmap_painter, self.pdf_handler, self.scaling_handler, 
-                    target_width, target_height, start_pdf_page, page_count)
-
-                pixmap_painter.end()
-
-                # 将高分辨率pixmap绘制到打印机
-                painter.drawPixmap(0, 0, pixmap)
-
-            painter.end()
-            
             # 隐藏进度条
             self.print_progress.setVisible(False)
-            QMessageBox.information(self, "打印", "打印完成！") # Display completion message
-            
+            self.print_progress.resetFormat()
+            peak_memory = ""
+            if stats.get("peak_memory_mb") is not None:
+                peak_memory = f"，内存峰值 {stats['peak_memory_mb']} MB"
+                if stats.get("peak_rss_mb") is not None:
+                    peak_memory += f"（进程RSS峰值 {stats['peak_rss_mb']} MB）"
+            QMessageBox.information(
+                self, "打印", f"打印完成！共 {stats['sheets']} 张，用时 {stats['seconds']:.1f} 秒，"
+                              f"条带高度 {stats['band_height']} 像素{peak_memory}")
+
         except Exception as e:
             # 隐藏进度条
             self.print_progress.setVisible(False)
+            self.print_progress.resetFormat()
             logging.error(f"打印过程中出错: {str(e)}")
             QMessageBox.critical(self, "打印错误", f"打印过程中出错: {str(e)}")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后的程序需要支持渲染子进程
     app = QApplication(sys.argv)
     window = PDFPrinterApp()
     window.show()
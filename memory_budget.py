@@ -0,0 +1,266 @@
+import ctypes
+import os
+import sys
+import threading
+import tracemalloc
+
+
+# 默认的全局内存预算（MB），0表示不限制
+DEFAULT_BUDGET_MB = 1024
+# 在途打印条带的最小高度（像素），预算再紧也不会低于该值
+MIN_BAND_HEIGHT = 64
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [
+        ("cb", ctypes.c_ulong),
+        ("PageFaultCount", ctypes.c_ulong),
+        ("PeakWorkingSetSize", ctypes.c_size_t),
+        ("WorkingSetSize", ctypes.c_size_t),
+        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+        ("PagefileUsage", ctypes.c_size_t),
+        ("PeakPagefileUsage", ctypes.c_size_t),
+    ]
+
+
+def _get_windows_rss():
+    counters = _ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    psapi = ctypes.windll.psapi
+    kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+    psapi.GetProcessMemoryInfo.argtypes = [ctypes.c_void_p, ctypes.POINTER(_ProcessMemoryCounters), ctypes.c_ulong]
+    if psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return counters.WorkingSetSize
+    return None
+
+
+def get_rss_bytes():
+    """当前进程的常驻内存（RSS，Windows上为工作集）字节数，无法获取时返回None"""
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        if sys.platform == "win32":
+            return _get_windows_rss()
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def _to_mb(size_bytes):
+    return round(size_bytes / (1024 * 1024), 1) if size_bytes is not None else None
+
+
+class MemorySampler:
+    """在后台线程中按固定间隔采样RSS（可选tracemalloc）并记录峰值 v2.0
+
+    with MemorySampler(use_tracemalloc=True) as sampler: ...
+    结束后 sampler.get_stats() 返回峰值。tracemalloc只统计Python分配的内存（不含Qt和fitz的像素缓冲区），
+    开销也较大，只用于排查Python对象的内存增长。
+    """
+
+    def __init__(self, interval=0.05, use_tracemalloc=False):
+        self.interval = interval
+        self.use_tracemalloc = use_tracemalloc
+        self.peak_rss = None
+        self.peak_traced = None
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_tracemalloc = False
+
+    def start(self):
+        self._stop.clear()
+        if self.use_tracemalloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="MemorySampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sample()
+        if self.use_tracemalloc:
+            self.peak_traced = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+        return self.get_stats()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """采样一次当前RSS"""
+        rss = get_rss_bytes()
+        if rss is not None:
+            self.peak_rss = rss if self.peak_rss is None else max(self.peak_rss, rss)
+        self.samples += 1
+
+    def get_stats(self):
+        stats = {"peak_rss_mb": _to_mb(self.peak_rss), "samples": self.samples}
+        if self.use_tracemalloc:
+            stats["peak_traced_mb"] = _to_mb(self.peak_traced)
+        return stats
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+
+class MemoryBudget:
+    """统计各渲染缓存和在途打印条带占用的内存，并按全局预算收缩 v2.0
+
+    注册的缓存（RenderCache）记录各自配置的预算；在途缓冲区（打印条带）通过 reserve()/release() 登记。
+    合计超出全局预算时按比例降低各缓存的预算（立即淘汰最久未使用的项），释放后恢复到配置的预算。
+    打印流水线按剩余额度降低同时在途的条带数，必要时降低条带高度。
+    budget_mb 为0时只统计不限制。
+    """
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB, sampling=None):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.sampling = sampling  # None、"rss" 或 "tracemalloc"
+        self._caches = {}  # 名称 -> (缓存, 配置的预算字节数, 最小预算字节数)
+        self._reservations = {}  # 名称 -> 字节数
+        self.peak_bytes = 0
+
+    def set_budget(self, budget_mb):
+        """设置全局预算（MB），0表示不限制"""
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.enforce()
+
+    def set_sampling(self, sampling):
+        """设置任务期间的内存采样方式（None表示只统计登记的字节数，"rss" 或 "tracemalloc"）"""
+        if sampling not in (None, "rss", "tracemalloc"):
+            raise ValueError(f"无效的内存采样方式: {sampling}")
+        self.sampling = sampling
+
+    def register_cache(self, name, cache, min_mb=0):
+        """登记一个RenderCache（以其当前预算为配置的预算），收缩时不低于 min_mb"""
+        self._caches[name] = (cache, cache.max_bytes, int(min_mb * 1024 * 1024))
+        self.enforce()
+
+    def unregister_cache(self, name):
+        """取消登记缓存（例如关闭打印预览时），其他缓存可以恢复到配置的预算"""
+        if self._caches.pop(name, None) is not None:
+            self.enforce()
+
+    def get_available(self, exclude=None):
+        """在途缓冲区还可以使用的字节数（各缓存收缩到最小预算后），不限制时返回None"""
+        if self.budget_bytes <= 0:
+            return None
+        floor = sum(min(configured, minimum) for _, configured, minimum in self._caches.values())
+        reserved = sum(size for name, size in self._reservations.items() if name != exclude)
+        return max(0, self.budget_bytes - floor - reserved)
+
+    def reserve(self, name, size_bytes):
+        """登记在途缓冲区（同名的登记被替换），必要时收缩缓存"""
+        self._reservations[name] = size_bytes
+        self.enforce()
+
+    def release(self, name):
+        """释放在途缓冲区的登记，缓存恢复到配置的预算"""
+        if self._reservations.pop(name, None) is not None:
+            self.enforce()
+
+    def enforce(self):
+        """按全局预算重新分配各缓存的预算"""
+        if self._caches:
+            scale = 1.0
+            if self.budget_bytes > 0:
+                configured_total = sum(configured for _, configured, _ in self._caches.values())
+                allowance = self.budget_bytes - sum(self._reservations.values())
+                if configured_total > allowance:
+                    scale = max(0.0, allowance / configured_total)
+            for cache, configured, minimum in self._caches.values():
+                max_bytes = max(min(configured, minimum), int(configured * scale))
+                if max_bytes != cache.max_bytes:
+                    cache.set_memory_budget(max_bytes / (1024 * 1024))
+        self.update_peak()
+
+    def plan_print_bands(self, bytes_per_line, band_height, window):
+        """在预算内规划打印条带，返回 (条带高度, 同时在途的条带数)
+
+        先降低在途条带数，只剩一个条带仍超出额度时再降低条带高度（不低于 MIN_BAND_HEIGHT）。
+        """
+        available = self.get_available(exclude="print")
+        if available is None:
+            return band_height, window
+        slot_bytes = bytes_per_line * band_height
+        window = max(1, min(window, available // max(1, slot_bytes)))
+        if window == 1 and slot_bytes > available:
+            band_height = min(band_height, max(MIN_BAND_HEIGHT, available // max(1, bytes_per_line)))
+        return band_height, window
+
+    def get_usage(self):
+        """当前占用: {"caches": {名称: 字节数}, "in_flight": {名称: 字节数}, "total": 字节数}"""
+        caches = {name: cache.current_bytes for name, (cache, _, _) in self._caches.items()}
+        in_flight = dict(self._reservations)
+        return {"caches": caches, "in_flight": in_flight,
+                "total": sum(caches.values()) + sum(in_flight.values())}
+
+    def update_peak(self):
+        """更新登记的内存占用峰值，返回当前合计"""
+        total = self.get_usage()["total"]
+        self.peak_bytes = max(self.peak_bytes, total)
+        return total
+
+    def reset_peak(self):
+        self.peak_bytes = self.update_peak()
+
+    def track_job(self):
+        """跟踪一个任务期间的内存峰值: with budget.track_job() as job: ...，结束后 job.get_stats()"""
+        return _JobMemory(self)
+
+    def get_stats(self):
+        """各缓存和在途缓冲区的占用（MB）、峰值和预算"""
+        usage = self.get_usage()
+        stats = {name: _to_mb(size) for name, size in usage["caches"].items()}
+        stats.update({f"{name}_in_flight": _to_mb(size) for name, size in usage["in_flight"].items()})
+        stats["total_mb"] = _to_mb(usage["total"])
+        stats["peak_mb"] = _to_mb(self.peak_bytes)
+        stats["budget_mb"] = _to_mb(self.budget_bytes) if self.budget_bytes > 0 else None
+        return stats
+
+
+class _JobMemory:
+    """一个任务期间的内存峰值（登记的字节数，以及按采样方式采样的RSS/tracemalloc峰值）
+
+    任务期间没有登记任何字节时（例如矢量导出不使用渲染缓存）不给出 peak_memory_mb。
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.sampler = None
+        self.stats = {}
+
+    def __enter__(self):
+        self.budget.reset_peak()
+        if self.budget.sampling:
+            self.sampler = MemorySampler(use_tracemalloc=self.budget.sampling == "tracemalloc").start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.budget.update_peak()
+        self.stats = {"peak_memory_mb": _to_mb(self.budget.peak_bytes)} if self.budget.peak_bytes > 0 else {}
+        if self.sampler is not None:
+            self.stats.update(self.sampler.stop())
+        return False
+
+    def get_stats(self):
+        return self.stats
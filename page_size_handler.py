@@ -7,6 +7,8 @@ class PageSizeHandler:
     def __init__(self):
         self.page_size = "A4"
         self.page_orientation = "portrait"
+        # 纸张几何缓存：(纸张尺寸, 方向) -> (宽, 高)（点），避免每次刷新都构建QPageLayout
+        self._paper_sizes = {}
     
     def _get_qpagesize_id(self, size_name):
         """将页面尺寸名称字符串映射到QPageSize.PageSizeId"""
@@ -37,15 +39,9 @@ class PageSizeHandler:
     
     def get_page_size_info(self):
         """获取当前页面尺寸的宽度和高度（像素，基于DPI）"""
-        page_layout = QPageLayout()
-        page_layout.setPageSize(QPageSize(self._get_qpagesize_id(self.page_size))) # Use helper
-        
-        if self.page_orientation == "portrait":
-            page_layout.setOrientation(QPageLayout.Portrait) # Revert here
-        else:
-            page_layout.setOrientation(QPageLayout.Landscape)  # Revert here
-        width_px = page_layout.pageSize().size(QPageSize.Point).width() * (96 / 72.0)
-        height_px = page_layout.pageSize().size(QPageSize.Point).height() * (96 / 72.0)
+        width_pts, height_pts = self.get_page_size_points()
+        width_px = width_pts * (96 / 72.0)
+        height_px = height_pts * (96 / 72.0)
         
         return {"width": int(width_px), "height": int(height_px)}
     
@@ -65,7 +61,14 @@ class PageSizeHandler:
 
 
     def get_page_size_points(self):
-        """获取当前页面尺寸的宽度和高度（点）"""
+        """获取当前页面尺寸的宽度和高度（点，按纸张尺寸和方向缓存）"""
+        key = (self.page_size, self.page_orientation)
+        size = self._paper_sizes.get(key)
+        if size is None:
+            size = self._paper_sizes[key] = self._compute_page_size_points()
+        return size
+
+    def _compute_page_size_points(self):
         page_layout = QPageLayout()
         page_layout.setPageSize(QPageSize(self._get_qpagesize_id(self.page_size))) # Use helper
         
@@ -1,21 +1,204 @@
+import mmap
+from array import array
+from collections import OrderedDict
+
 import fitz  # PyMuPDF
-from PyQt5.QtGui import QPixmap
+from PyQt5 import sip
+from PyQt5.QtGui import QImage, QPixmap
+
+from disk_render_cache import make_document_fingerprint
+from render_cache import RenderCache
+from tracing import tracer
+
+
+COLORSPACES = {
+    "rgb": fitz.csRGB,
+    "gray": fitz.csGRAY,
+}
+
+
+def _qimage_format(n, alpha):
+    """根据通道数返回对应的QImage格式，无法直接表示时返回None"""
+    if n == 1 and not alpha:
+        return QImage.Format_Grayscale8
+    if n == 3 and not alpha:
+        return QImage.Format_RGB888
+    if n == 4 and alpha:
+        # MuPDF的带透明通道像素是预乘alpha的
+        return QImage.Format_RGBA8888_Premultiplied
+    return None
+
+
+def normalize_pixmap(pix):
+    """将CMYK、灰度+alpha等QImage无法直接表示的格式转换为RGB"""
+    if _qimage_format(pix.n, pix.alpha) is None:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return pix
+
+
+def pixmap_to_qimage(pix):
+    """将fitz.Pixmap直接包装为QImage（不编码/解码，不复制像素数据）"""
+    pix = normalize_pixmap(pix)
+    fmt = _qimage_format(pix.n, pix.alpha)
+    if hasattr(pix, "samples_ptr"):
+        img = QImage(sip.voidptr(pix.samples_ptr), pix.width, pix.height, pix.stride, fmt)
+    else:
+        # 旧版本PyMuPDF没有samples_ptr，退化为一次复制
+        img = QImage(pix.samples, pix.width, pix.height, pix.stride, fmt)
+    # QImage不拥有像素缓冲区，必须保持fitz.Pixmap存活
+    img._fitz_pixmap = pix
+    return img
+
+
+def samples_to_qimage(samples, width, height, stride, n, alpha):
+    """将原始像素数据（例如来自渲染进程）包装为QImage"""
+    img = QImage(samples, width, height, stride, _qimage_format(n, alpha))
+    img._samples = samples
+    return img
 
 
 class PDFHandler:
     """处理PDF文件的类 v2.0"""
     
-    def __init__(self):
+    def __init__(self, cache_memory_mb=256, display_list_cache_size=16):
         self.pdf_document = None
+        self.file_path = None
+        # 渲染缓存，键为 (页码, DPI, 旋转角度, 色彩空间)
+        self.render_cache = RenderCache(cache_memory_mb)
+        # 页面显示列表缓存（页码 -> fitz.DisplayList），按页面数量进行LRU淘汰；
+        # 显示列表保存解析后的绘制指令，缩放或旋转后重新渲染时不必再解析页面内容
+        self.display_lists = OrderedDict()
+        self.display_list_cache_size = display_list_cache_size
+        # 文档几何表：全部页面的尺寸（点，已考虑页面旋转）和旋转角度
+        self._reset_geometry()
+        # 以内存映射方式打开时的 (mmap, memoryview)
+        self._mapping = None
+        # 可选的跨会话磁盘渲染缓存 (DiskRenderCache)，按文档指纹区分文档
+        self.disk_cache = None
+        self.fingerprint = None
+
+    def set_disk_cache(self, disk_cache):
+        """设置磁盘渲染缓存（None表示关闭）"""
+        self.disk_cache = disk_cache
+        if disk_cache is not None and self.pdf_document and self.file_path:
+            self.fingerprint = make_document_fingerprint(self.pdf_document, self.file_path)
     
-    def load_pdf(self, file_path):
-        """加载PDF文件"""
+    def _open_mapped(self, file_path):
+        """以内存映射方式打开PDF文件：由操作系统按需调入页面，不必把文件读入内存"""
         try:
-            self.pdf_document = fitz.open(file_path)
-            return True
+            with open(file_path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # 空文件或不支持内存映射的文件系统，直接按路径打开
+            return fitz.open(file_path), None
+        view = memoryview(mapping)
+        try:
+            return fitz.open(stream=view, filetype="pdf"), (mapping, view)
+        except Exception:
+            view.release()
+            mapping.close()
+            raise
+
+    def _close_document(self):
+        # 显示列表引用文档中的资源，先于文档释放
+        self.display_lists.clear()
+        if self.pdf_document:
+            self.pdf_document.close()
+            self.pdf_document = None
+        if self._mapping is not None:
+            mapping, view = self._mapping
+            self._mapping = None
+            view.release()
+            mapping.close()
+
+    def load_pdf(self, file_path, build_geometry=True):
+        """加载PDF文件
+
+        build_geometry 为False时不立即建立几何表：页面尺寸按需逐页读取，
+        之后可以用 set_geometry 装入在后台建立的几何表（大文档）。
+        """
+        try:
+            document, mapping = self._open_mapped(file_path)
         except Exception as e:
             print(f"无法加载PDF文件: {str(e)}")
             return False
+        self._close_document()
+        self.pdf_document = document
+        self._mapping = mapping
+        self.file_path = file_path
+        self.fingerprint = make_document_fingerprint(self.pdf_document, file_path) \
+            if self.disk_cache is not None else None
+        self.render_cache.clear()
+        self.display_lists.clear()
+        self._reset_geometry()
+        if build_geometry:
+            self.build_geometry()
+        return True
+    
+    def select_pages(self, page_indices):
+        """只保留指定的页面（按给定顺序），用于按页面范围打印"""
+        if self.pdf_document:
+            self.pdf_document.select(list(page_indices))
+            # 内存中的文档已与磁盘文件不同，后台渲染进程不能再按路径打开它
+            self.file_path = None
+            self.fingerprint = None
+            self.render_cache.clear()
+            self.display_lists.clear()
+            self.build_geometry()
+
+    def _get_inherited_rotation(self, xref):
+        """读取页面字典的/Rotate（可能继承自父页面树节点）"""
+        doc = self.pdf_document
+        for _ in range(32):  # 防止损坏文件中的循环引用
+            kind, value = doc.xref_get_key(xref, "Rotate")
+            if kind == "int":
+                rotation = int(value) % 360
+                return rotation if rotation % 90 == 0 else 0
+            kind, value = doc.xref_get_key(xref, "Parent")
+            if kind != "xref":
+                break
+            xref = int(value.split()[0])
+        return 0
+
+    def _read_page_geometry(self, page_index):
+        """读取单个页面的 (宽, 高, 旋转角度)；PDF文件直接读取页面字典，不创建页面对象"""
+        doc = self.pdf_document
+        if doc.is_pdf:
+            try:
+                cropbox = doc.page_cropbox(page_index)
+                rotation = self._get_inherited_rotation(doc.page_xref(page_index))
+                if rotation in (90, 270):
+                    return cropbox.height, cropbox.width, rotation
+                return cropbox.width, cropbox.height, rotation
+            except Exception:
+                pass
+        # 非PDF文档或无法直接读取页面字典时退化为创建页面对象
+        page = doc[page_index]
+        return page.rect.width, page.rect.height, page.rotation
+
+    def _reset_geometry(self):
+        self.page_widths = array("d")
+        self.page_heights = array("d")
+        self.page_rotations = array("H")
+        self.geometry_ready = False
+
+    def build_geometry(self):
+        """建立文档几何表（全部页面的尺寸和旋转角度）"""
+        page_count = self.get_page_count()
+        widths = array("d", [0.0]) * page_count
+        heights = array("d", [0.0]) * page_count
+        rotations = array("H", [0]) * page_count
+        for i in range(page_count):
+            widths[i], heights[i], rotations[i] = self._read_page_geometry(i)
+        self.set_geometry(widths, heights, rotations)
+
+    def set_geometry(self, widths, heights, rotations):
+        """装入文档几何表（例如在后台进程中建立的），页面数量不符时忽略并返回False"""
+        if not (len(widths) == len(heights) == len(rotations) == self.get_page_count()):
+            return False
+        self.page_widths, self.page_heights, self.page_rotations = widths, heights, rotations
+        self.geometry_ready = True
+        return True
     
     def get_page_count(self):
         """获取PDF页面总数"""
@@ -30,26 +213,170 @@ class PDFHandler:
         return None
     
     def get_page_size(self, page_index):
-        """获取指定页面的尺寸 (以点为单位)"""
-        page = self.get_page(page_index)
-        if page:
-            rect = page.rect
-            return rect.width, rect.height
+        """获取指定页面的尺寸 (以点为单位，从几何表读取；几何表尚未建立时逐页读取)"""
+        if self.geometry_ready:
+            if 0 <= page_index < len(self.page_widths):
+                return self.page_widths[page_index], self.page_heights[page_index]
+        elif 0 <= page_index < self.get_page_count():
+            return self._read_page_geometry(page_index)[:2]
         return 0, 0
+
+    def get_page_rotation(self, page_index):
+        """获取指定页面自身的旋转角度（PDF中的/Rotate）"""
+        if self.geometry_ready:
+            if 0 <= page_index < len(self.page_rotations):
+                return self.page_rotations[page_index]
+        elif 0 <= page_index < self.get_page_count():
+            return self._read_page_geometry(page_index)[2]
+        return 0
     
-    def render_page(self, page_index, dpi=96):
-        """渲染页面为Pixmap，以指定DPI"""
-        page = self.get_page(page_index)
-        if page:
-            # Create a matrix for the desired DPI, without applying user zoom
-            zoom_factor = dpi / 72.0  # Default PDF DPI is 72
-            mat = fitz.Matrix(zoom_factor, zoom_factor)
-            
-            pix = page.get_pixmap(matrix=mat)
-            img = QPixmap()
-            img.loadFromData(pix.tobytes("ppm"))
+    def render_page(self, page_index, dpi=96, rotation=0, colorspace="rgb"):
+        """渲染页面为QPixmap，以指定DPI（仅在GUI需要QPixmap时使用）"""
+        img = self.render_page_image(page_index, dpi, rotation, colorspace)
+        if img is not None:
+            return QPixmap.fromImage(img)
+        return None
+
+    def make_cache_key(self, page_index, dpi=96, rotation=0, colorspace="rgb"):
+        """生成渲染缓存键"""
+        return (page_index, round(dpi, 3), rotation % 360, colorspace)
+
+    def render_page_image(self, page_index, dpi=96, rotation=0, colorspace="rgb", persist=True):
+        """渲染页面为QImage，以指定DPI（结果会被缓存）
+
+        persist 与 RenderWorkerPool.submit 相同：为False时渲染结果不写入磁盘缓存（缩略图另有缩略图缓存）。
+        """
+        key = self.make_cache_key(page_index, dpi, rotation, colorspace)
+        img = self.render_cache.get(key)
+        if img is not None:
+            return img
+
+        # 再查磁盘缓存（之前的会话中渲染过的页面）
+        if self.disk_cache is not None and self.fingerprint is not None:
+            result = self.disk_cache.load(self.fingerprint, key)
+            if result is not None:
+                img = samples_to_qimage(*result)
+                self.render_cache.put(key, img)
+                return img
+
+        pix = self.get_page_pixmap(page_index, dpi, rotation, colorspace)
+        if pix is not None:
+            with tracer.span("convert", page=page_index):
+                pix = normalize_pixmap(pix)
+                img = pixmap_to_qimage(pix)
+            self.render_cache.put(key, img)
+            if persist and self.disk_cache is not None:
+                self.disk_cache.put(self.fingerprint, key, pix)
             return img
         return None
+
+    def get_best_cached_image(self, page_index, rotation=0, colorspace="rgb"):
+        """在内存渲染缓存中查找该页面任意DPI的渲染结果（DPI最高者），返回 (QImage, DPI) 或None
+
+        不调用fitz渲染，用于在完整渲染完成前快速显示草稿；草稿查找不计入缓存的命中统计，也不改变LRU顺序。
+        """
+        rotation %= 360
+        best_key = None
+        for key in self.render_cache.keys():
+            if key[0] == page_index and key[2] == rotation and key[3] == colorspace:
+                if best_key is None or key[1] > best_key[1]:
+                    best_key = key
+        if best_key is None:
+            return None
+        img = self.render_cache.peek(best_key)
+        return (img, best_key[1]) if img is not None else None
+
+    def has_rendered(self, key):
+        """渲染结果是否已在内存或磁盘缓存中（不需要再调用fitz渲染）"""
+        if key in self.render_cache:
+            return True
+        return self.disk_cache is not None and self.disk_cache.contains(self.fingerprint, key)
+
+    def get_render_matrix(self, dpi=96, rotation=0):
+        """获取渲染矩阵（缩放到指定DPI并顺时针旋转）"""
+        # Create a matrix for the desired DPI, without applying user zoom
+        zoom_factor = dpi / 72.0  # Default PDF DPI is 72
+        mat = fitz.Matrix(zoom_factor, zoom_factor)
+        if rotation % 360:
+            mat.prerotate(rotation)
+        return mat
+
+    def get_render_bounds(self, page_index, dpi=96, rotation=0):
+        """获取整页渲染结果在渲染矩阵空间中的像素范围 (fitz.IRect)"""
+        width, height = self.get_page_size(page_index)
+        if width > 0 and height > 0:
+            return (fitz.Rect(0, 0, width, height) * self.get_render_matrix(dpi, rotation)).irect
+        return None
+
+    def get_display_list(self, page_index):
+        """获取页面的fitz.DisplayList（首次使用时解析页面内容并缓存）"""
+        display_list = self.display_lists.get(page_index)
+        if display_list is not None:
+            self.display_lists.move_to_end(page_index)
+            return display_list
+        page = self.get_page(page_index)
+        if page is None:
+            return None
+        with tracer.span("parse", page=page_index):
+            display_list = page.get_displaylist()
+        if self.display_list_cache_size > 0:
+            self.display_lists[page_index] = display_list
+            while len(self.display_lists) > self.display_list_cache_size:
+                self.display_lists.popitem(last=False)
+        return display_list
+
+    def set_display_list_cache_size(self, size):
+        """设置最多缓存的页面显示列表数量，超出部分立即淘汰"""
+        self.display_list_cache_size = size
+        while self.display_lists and len(self.display_lists) > size:
+            self.display_lists.popitem(last=False)
+
+    def get_page_pixmap(self, page_index, dpi=96, rotation=0, colorspace="rgb", clip=None):
+        """用fitz渲染页面，返回fitz.Pixmap（不经过渲染缓存）
+
+        从页面的显示列表按所需矩阵光栅化，缩放、旋转变化后只需重新光栅化。
+        clip 为页面坐标（点）中的裁剪矩形，只渲染该区域。
+        """
+        with tracer.span("render", page=page_index, dpi=dpi):
+            display_list = self.get_display_list(page_index)
+            if display_list is not None:
+                mat = self.get_render_matrix(dpi, rotation)
+                return display_list.get_pixmap(matrix=mat, colorspace=COLORSPACES[colorspace], alpha=False, clip=clip)
+        return None
+
+    def render_page_region(self, page_index, region, dpi=96, rotation=0, colorspace="rgb"):
+        """只渲染整页渲染结果中的一个像素区域（不缓存）
+
+        region 为 (x0, y0, x1, y1)，相对整页渲染结果的左上角。
+        返回 (QImage, x, y)，其中 x, y 为结果在整页渲染结果中的位置；区域为空时返回None。
+        """
+        bounds = self.get_render_bounds(page_index, dpi, rotation)
+        if bounds is None:
+            return None
+        x0, y0, x1, y1 = region
+        rect = fitz.Rect(bounds.x0 + x0, bounds.y0 + y0, bounds.x0 + x1, bounds.y0 + y1) & fitz.Rect(bounds)
+        if rect.is_empty:
+            return None
+
+        mat = self.get_render_matrix(dpi, rotation)
+        pix = self.get_page_pixmap(page_index, dpi, rotation, colorspace, clip=rect * ~mat)
+        if pix is None or pix.width == 0 or pix.height == 0:
+            return None
+        with tracer.span("convert", page=page_index):
+            img = pixmap_to_qimage(pix)
+        return img, pix.x - bounds.x0, pix.y - bounds.y0
+
+    def set_cache_memory_budget(self, max_memory_mb):
+        """设置渲染缓存的内存预算（MB）"""
+        self.render_cache.set_memory_budget(max_memory_mb)
+
+    def get_cache_stats(self):
+        """获取渲染缓存统计信息（命中/未命中次数等），启用磁盘缓存时包含其统计信息"""
+        stats = self.render_cache.get_stats()
+        stats["display_lists"] = len(self.display_lists)
+        if self.disk_cache is not None:
+            stats["disk"] = self.disk_cache.get_stats()
+        return stats
     
     def get_page_orientation(self, page_index):
         """获取指定页面的固有方向 ('portrait' 或 'landscape')"""
@@ -61,6 +388,9 @@ class PDFHandler:
     
     def close(self):
         """关闭PDF文件"""
-        if self.pdf_document:
-            self.pdf_document.close()
-            self.pdf_document = None
\ No newline at end of file
+        self._close_document()
+        self.file_path = None
+        self.fingerprint = None
+        self.render_cache.clear()
+        self.display_lists.clear()
+        self._reset_geometry()
\ No newline at end of file
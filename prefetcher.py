@@ -0,0 +1,102 @@
+from render_worker import PRIORITY_PREFETCH
+
+
+class SheetPrefetcher:
+    """在空闲时预渲染相邻页面（组）到页面缓存的类 v2.0"""
+
+    # 提交到后台渲染工作池的任务标签
+    RENDER_TAG = "prefetch"
+
+    def __init__(self, pdf_handler, scaling_handler, page_size_handler, layout_handler,
+                 display_handler, render_pool, depth=2):
+        self.pdf_handler = pdf_handler
+        self.scaling_handler = scaling_handler
+        self.page_size_handler = page_size_handler
+        self.layout_handler = layout_handler
+        self.display_handler = display_handler
+        self.render_pool = render_pool
+        self.depth = depth  # 向前、向后各预取的页面（组）数
+        self._context = None
+        self._last_page = None
+        self._prefetched = {}  # 起始页 -> 预取的缓存键列表
+        self.hits = 0  # 显示时预取结果已全部就绪
+        self.misses = 0  # 预取过但尚未完成或已被淘汰
+        self.unpredicted = 0  # 显示的页面（组）不在预取范围内
+
+    def set_depth(self, depth):
+        """设置预取深度（0表示关闭预取）"""
+        self.depth = max(0, int(depth))
+        if self.depth == 0:
+            self.cancel()
+
+    def cancel(self):
+        """取消所有尚未开始的预取任务"""
+        self.render_pool.cancel(self.RENDER_TAG)
+        self._prefetched.clear()
+
+    def _get_context(self):
+        """影响渲染结果的全部设置；任意一项变化时之前的预取都失效"""
+        return (self.pdf_handler.file_path,
+                self.layout_handler.adaptive_mode,
+                self.layout_handler.pages_per_sheet,
+                self.scaling_handler.scale_factor,
+                self.scaling_handler.rotation_angle,
+                self.page_size_handler.page_size,
+                self.page_size_handler.page_orientation,
+                self.display_handler.display_scale_factor)
+
+    def _check_context(self):
+        context = self._get_context()
+        if context != self._context:
+            self.cancel()
+            self._context = context
+            self._last_page = None
+
+    def record_display(self, current_page):
+        """在显示页面（组）之前调用，统计预取命中情况"""
+        self._check_context()
+        if current_page == self._last_page:
+            return
+        self._last_page = current_page
+
+        keys = self._prefetched.pop(current_page, None)
+        if keys is None:
+            self.unpredicted += 1
+        elif all(self.pdf_handler.has_rendered(key) for key in keys):
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def prefetch_around(self, current_page):
+        """在显示页面（组）之后调用，按距离由近到远预取前后各depth个页面（组）"""
+        page_count = self.pdf_handler.get_page_count()
+        if self.depth <= 0 or page_count == 0:
+            return
+        self._check_context()
+
+        # 重新按与当前页面的距离排队，离开预取范围的任务被取消
+        self.render_pool.cancel(self.RENDER_TAG)
+        self._prefetched = {}
+        step = self.layout_handler.pages_per_sheet if self.layout_handler.adaptive_mode else 1
+        for distance in range(1, self.depth + 1):
+            for start_page in (current_page + distance * step, current_page - distance * step):
+                if not 0 <= start_page < page_count:
+                    continue
+                if self.display_handler.is_tiled(start_page):
+                    continue  # 按图块显示的页面只渲染可见部分，不预取整页
+                keys = self.display_handler.get_render_keys(start_page)
+                self._prefetched[start_page] = keys
+                for key in keys:
+                    self.render_pool.submit(key, priority=PRIORITY_PREFETCH + distance, tag=self.RENDER_TAG,
+                                            persist=True)
+
+    def get_stats(self):
+        """获取预取统计信息，用于调整预取深度"""
+        displays = self.hits + self.misses + self.unpredicted
+        return {
+            "depth": self.depth,
+            "hits": self.hits,
+            "misses": self.misses,
+            "unpredicted": self.unpredicted,
+            "hit_rate": self.hits / displays if displays else 0.0,
+        }
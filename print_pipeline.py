@@ -0,0 +1,305 @@
+import ctypes
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+from PyQt5 import sip
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QImage, QPainter
+
+from pdf_handler import PDFHandler
+from scaling_handler import ScalingHandler
+from page_size_handler import PageSizeHandler
+from layout_handler import LayoutHandler
+from memory_budget import MemoryBudget
+from tracing import tracer
+
+
+# 打印进程中的PDF处理器（每个进程持有自己的fitz文档句柄）
+_worker_pdf_handler = None
+
+
+def _bytes_per_line(width):
+    """RGB888每行字节数（QImage要求按4字节对齐）"""
+    return (width * 3 + 3) & ~3
+
+
+def _wrap_buffer(buffer, width, height):
+    """把可写缓冲区（共享内存）包装为QImage，直接在其中绘制"""
+    c_buffer = ctypes.c_char.from_buffer(buffer)
+    address = ctypes.addressof(c_buffer)
+    del c_buffer  # 不保留导出的指针，否则无法关闭共享内存
+    return QImage(sip.voidptr(address), width, height, _bytes_per_line(width), QImage.Format_RGB888)
+
+
+def _get_sheet_target(pdf_handler, page_size_handler, width, height):
+    """根据页面方向调整目标尺寸"""
+    if pdf_handler.get_page_count() > 0:
+        pdf_width, pdf_height = pdf_handler.get_page_size(0)
+        return page_size_handler.adjust_dimensions_for_orientation(width, height, pdf_width, pdf_height)
+    return width, height
+
+
+def _get_sheet_pages(pdf_handler, layout_handler, sheet_index):
+    """获取重排页面的起始PDF页面索引和页面数量"""
+    pages_per_sheet = layout_handler.pages_per_sheet
+    start_pdf_page = sheet_index * pages_per_sheet
+    remaining_pages = pdf_handler.get_page_count() - start_pdf_page
+    return start_pdf_page, min(pages_per_sheet, remaining_pages)
+
+
+def get_sheet_render_keys(pdf_handler, scaling_handler, page_size_handler, layout_handler, sheet_index, width, height):
+    """获取compose_sheet在 width x height 的图像上绘制一张重排页面所需的页面渲染缓存键"""
+    target_width, target_height = _get_sheet_target(pdf_handler, page_size_handler, width, height)
+    start_pdf_page, page_count = _get_sheet_pages(pdf_handler, layout_handler, sheet_index)
+    return layout_handler.get_sheet_render_keys(
+        pdf_handler, scaling_handler, target_width, target_height, start_pdf_page, page_count)
+
+
+def compose_sheet(image, pdf_handler, scaling_handler, page_size_handler, layout_handler, sheet_index,
+                  band_top=0, sheet_height=None):
+    """在QImage上绘制一张重排页面（与原来的逐张打印绘制方式一致）
+
+    分条打印时 image 只是整张页面中从 band_top 开始的一个水平条带，sheet_height 为整张页面的高度。
+    """
+    with tracer.span("compose", "compose_sheet", sheet=sheet_index, band_top=band_top):
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setRenderHint(QPainter.TextAntialiasing, True)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+
+        target_width, target_height = _get_sheet_target(
+            pdf_handler, page_size_handler, image.width(), sheet_height or image.height())
+
+        clip_rect = None
+        if sheet_height is not None:
+            painter.translate(0, -band_top)
+            clip_rect = QRectF(0, band_top, image.width(), image.height())
+
+        start_pdf_page, page_count = _get_sheet_pages(pdf_handler, layout_handler, sheet_index)
+        layout_handler.draw_adaptive_pages(
+            painter, pdf_handler, scaling_handler, target_width, target_height, start_pdf_page, page_count, clip_rect)
+        painter.end()
+
+
+def _rasterize_in_worker(settings, shm_name, sheet_index, band_top, band_height, width, height):
+    """在打印进程中把一张重排页面（的一个条带）栅格化到共享内存
+
+    主进程打开了跟踪时，同时返回本任务中记录的区间。
+    """
+    global _worker_pdf_handler
+    tracer.set_enabled(settings["trace"])
+    if _worker_pdf_handler is None:
+        # 每个条带只按裁剪区域渲染一次，不会复用，不设渲染缓存（否则其内存不在全局预算的统计之内）
+        _worker_pdf_handler = PDFHandler(cache_memory_mb=0)
+    if _worker_pdf_handler.file_path != settings["file_path"]:
+        _worker_pdf_handler.close()
+        if not _worker_pdf_handler.load_pdf(settings["file_path"], build_geometry=False):
+            raise RuntimeError(f"无法加载PDF文件: {settings['file_path']}")
+
+    scaling_handler = ScalingHandler()
+    scaling_handler.set_scale_factor(settings["scale_factor"])
+    scaling_handler.set_rotation_angle(settings["rotation_angle"])
+    page_size_handler = PageSizeHandler()
+    page_size_handler.set_page_size(settings["page_size"])
+    page_size_handler.set_page_orientation(settings["page_orientation"])
+    layout_handler = LayoutHandler(page_size_handler)
+    layout_handler.set_pages_per_sheet(settings["pages_per_sheet"])
+
+    # 子进程与主进程共用resource_tracker，共享内存由主进程统一unlink
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = _wrap_buffer(shm.buf, width, band_height)
+        compose_sheet(image, _worker_pdf_handler, scaling_handler, page_size_handler, layout_handler,
+                      sheet_index, band_top, height if band_height < height else None)
+        del image
+    finally:
+        shm.close()
+    return sheet_index, band_top, tracer.drain()
+
+
+class PrintPipeline:
+    """多进程并行栅格化、按顺序送入打印机的打印流水线 v2.0
+
+    打印进程（各自持有fitz文档句柄）把重排页面栅格化到主进程分配的共享内存槽中，
+    主进程严格按顺序把结果绘制到QPrinter。同时在途的任务数受 window 限制以控制内存。
+    band_height 大于0时按水平条带栅格化，内存峰值由条带高度而不是纸张尺寸决定。
+    在途条带登记在全局内存预算 (MemoryBudget) 中，预算不足时先收缩渲染缓存，再降低在途条带数和条带高度。
+    """
+
+    # 默认条带高度（像素）
+    DEFAULT_BAND_HEIGHT = 1024
+
+    def __init__(self, pdf_handler, scaling_handler, page_size_handler, layout_handler,
+                 workers=None, window=None, band_height=DEFAULT_BAND_HEIGHT, memory_budget=None):
+        self.pdf_handler = pdf_handler
+        self.scaling_handler = scaling_handler
+        self.page_size_handler = page_size_handler
+        self.layout_handler = layout_handler
+        self.workers = workers if workers is not None else max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.window = window or self.workers * 2
+        self.band_height = band_height
+        # 未指定全局预算时只统计在途条带的内存，不限制
+        self.memory_budget = memory_budget if memory_budget is not None else MemoryBudget(0)
+        self.stats = {}
+
+    def set_band_height(self, band_height):
+        """设置条带高度（像素），0表示整页栅格化"""
+        self.band_height = max(0, int(band_height))
+
+    def get_raster_size(self, page_width, page_height, resolution):
+        """计算栅格尺寸：不超过渲染DPI上限，更高的打印机分辨率由打印机缩放"""
+        raster_scale = min(1.0, self.layout_handler.max_render_dpi / resolution) if resolution > 0 else 1.0
+        return max(1, int(page_width * raster_scale)), max(1, int(page_height * raster_scale))
+
+    def get_bands(self, height, band_height=None):
+        """获取一张页面的条带列表 [(band_top, band_height), ...]（band_height默认为设置的条带高度）"""
+        band_height = band_height or self.band_height
+        band_height = band_height if 0 < band_height < height else height
+        return [(top, min(band_height, height - top)) for top in range(0, height, band_height)]
+
+    def _get_settings(self):
+        return {
+            "file_path": self.pdf_handler.file_path,
+            "pages_per_sheet": self.layout_handler.pages_per_sheet,
+            "scale_factor": self.scaling_handler.scale_factor,
+            "rotation_angle": self.scaling_handler.rotation_angle,
+            "page_size": self.page_size_handler.page_size,
+            "page_orientation": self.page_size_handler.page_orientation,
+            "trace": tracer.enabled,
+        }
+
+    def run(self, total_sheets, width, height, progress_callback=None):
+        """按顺序逐条生成栅格化的重排页面 (sheet_index, band_top, QImage)
+
+        不分条时每张页面只有一个 band_top 为0的条带。
+        生成的QImage在下一次迭代前有效，调用者应立即把它绘制到打印机。
+        progress_callback(已渲染张数, 已送出张数) 用于报告进度。
+        """
+        start_time = time.perf_counter()
+        # 文档不是磁盘文件（或页数很少）时在本进程中栅格化
+        parallel = self.workers > 0 and self.pdf_handler.file_path is not None and total_sheets > 2
+
+        # 在内存预算内确定条带高度和同时在途的条带数
+        bands = self.get_bands(height)
+        band_height, window = self.memory_budget.plan_print_bands(
+            _bytes_per_line(width), bands[0][1], self.window if parallel else 1)
+        bands = self.get_bands(height, band_height)
+        in_flight_bytes = _bytes_per_line(width) * bands[0][1] * window
+
+        jobs = [(sheet_index, band_top, band_height)
+                for sheet_index in range(total_sheets) for band_top, band_height in bands]
+        self.stats = {
+            "sheets": total_sheets,
+            "raster_size": (width, height),
+            "band_height": bands[0][1],
+            "bands_per_sheet": len(bands),
+            "band_memory_mb": _bytes_per_line(width) * bands[0][1] / (1024 * 1024),
+            "window": window,
+            "in_flight_mb": in_flight_bytes / (1024 * 1024),
+        }
+
+        def report(rendered_bands, spooled_bands):
+            if progress_callback:
+                progress_callback(rendered_bands // len(bands), spooled_bands // len(bands))
+
+        self.memory_budget.reserve("print", in_flight_bytes)
+        try:
+            if parallel:
+                self.stats["workers"] = self.workers
+                results = self._run_parallel(jobs, width, height, report, window)
+            else:
+                self.stats["workers"] = 0
+                results = self._run_local(jobs, width, height, report)
+            for result in results:
+                yield result
+                self.memory_budget.update_peak()
+        finally:
+            self.memory_budget.release("print")
+        self.stats["seconds"] = time.perf_counter() - start_time
+
+    def print_to(self, printer, total_sheets, progress_callback=None):
+        """把全部重排页面逐条送入打印机（或PDF格式的QPrinter），返回统计信息
+
+        栅格分辨率低于打印机分辨率时由打印机缩放；每张页面只需一个条带大小的栅格缓冲区。
+        """
+        page_rect = printer.pageRect()
+        width, height = self.get_raster_size(page_rect.width(), page_rect.height(), printer.resolution())
+        # 栅格像素到打印机坐标的比例
+        raster_scale = page_rect.height() / height
+
+        painter = QPainter()
+        if not painter.begin(printer):
+            raise RuntimeError("无法开始打印")
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        # 任务期间的内存峰值（在途条带和渲染缓存，按设置的采样方式还包括RSS）写入统计信息
+        with self.memory_budget.track_job() as job_memory:
+            try:
+                for sheet_index, band_top, image in self.run(total_sheets, width, height, progress_callback):
+                    with tracer.span("spool", sheet=sheet_index, band_top=band_top):
+                        if sheet_index > 0 and band_top == 0:
+                            printer.newPage()
+                        target_rect = QRectF(0, band_top * raster_scale, page_rect.width(), image.height() * raster_scale)
+                        painter.drawImage(target_rect, image)
+            finally:
+                painter.end()
+        self.stats.update(job_memory.get_stats())
+        return self.stats
+
+    def _run_local(self, jobs, width, height, report):
+        buffer = QImage(width, jobs[0][2], QImage.Format_RGB888) if jobs else None
+        for job_index, (sheet_index, band_top, band_height) in enumerate(jobs):
+            # 最后一个条带可能较矮，复用同一块缓冲区
+            image = buffer if band_height == buffer.height() else buffer.copy(0, 0, width, band_height)
+            compose_sheet(image, self.pdf_handler, self.scaling_handler, self.page_size_handler,
+                          self.layout_handler, sheet_index, band_top, height if band_height < height else None)
+            report(job_index + 1, job_index)
+            yield sheet_index, band_top, image
+            report(job_index + 1, job_index + 1)
+
+    @staticmethod
+    def _count_done(futures):
+        return sum(1 for future, _ in futures.values() if future.done())
+
+    def _run_parallel(self, jobs, width, height, report, window):
+        settings = self._get_settings()
+        slot_size = _bytes_per_line(width) * jobs[0][2]
+        window = min(window, len(jobs))
+        free_slots = [shared_memory.SharedMemory(create=True, size=slot_size) for _ in range(window)]
+        all_slots = list(free_slots)
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        futures = {}  # job_index -> (future, slot)
+        next_to_submit = 0
+        try:
+            for job_index, (sheet_index, band_top, band_height) in enumerate(jobs):
+                # 在途窗口内尽量多地提交任务
+                while free_slots and next_to_submit < len(jobs):
+                    slot = free_slots.pop()
+                    future = executor.submit(_rasterize_in_worker, settings, slot.name,
+                                             *jobs[next_to_submit], width, height)
+                    futures[next_to_submit] = (future, slot)
+                    next_to_submit += 1
+
+                # 等待下一个（按顺序）任务完成，期间保持界面响应
+                future, slot = futures[job_index]
+                with tracer.span("wait", sheet=sheet_index, band_top=band_top):
+                    while not future.done():
+                        wait([future], timeout=0.05, return_when=FIRST_COMPLETED)
+                        report(job_index + self._count_done(futures), job_index)
+                tracer.add_events(future.result()[2])
+                del futures[job_index]
+
+                image = _wrap_buffer(slot.buf, width, band_height)
+                report(job_index + 1 + self._count_done(futures), job_index)
+                yield sheet_index, band_top, image
+                del image
+                free_slots.append(slot)
+                report(job_index + 1 + self._count_done(futures), job_index + 1)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            for slot in all_slots:
+                slot.close()
+                slot.unlink()
@@ -0,0 +1,95 @@
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QComboBox, QDialog, QHBoxLayout, QLabel, QPushButton, QSpinBox, QVBoxLayout
+
+from sheet_renderer import SheetRenderer
+from virtual_sheet_view import VirtualSheetView
+
+
+class PrintPreviewDialog(QDialog):
+    """打印预览对话框：只渲染可见的重排页面，打开时间与页数无关 v2.0"""
+
+    # 用户在预览中点击了打印
+    print_requested = pyqtSignal()
+
+    # 提交到后台渲染工作池的任务标签
+    RENDER_TAG = "preview"
+
+    def __init__(self, pdf_handler, scaling_handler, page_size_handler, layout_handler,
+                 render_pool=None, memory_budget=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("打印预览")
+        self.resize(900, 800)
+
+        self.sheet_renderer = SheetRenderer(pdf_handler, scaling_handler, page_size_handler, layout_handler,
+                                            render_pool, render_tag=self.RENDER_TAG, parent=self)
+        self.view = VirtualSheetView(self.sheet_renderer)
+        # 预览的重排页面缓存计入全局内存预算，关闭时取消登记
+        self.memory_budget = memory_budget
+        if memory_budget is not None:
+            memory_budget.register_cache("preview", self.sheet_renderer.sheet_cache, min_mb=16)
+
+        self.zoom_combo = QComboBox()
+        self.zoom_combo.addItem("适应宽度", -1)
+        for text, value in [("50%", 0.5), ("75%", 0.75), ("100%", 1.0), ("150%", 1.5), ("200%", 2.0)]:
+            self.zoom_combo.addItem(text, value)
+        self.zoom_combo.setFixedWidth(100)
+
+        self.sheet_spinbox = QSpinBox()
+        self.sheet_label = QLabel()
+        self.print_button = QPushButton("打印...")
+        self.close_button = QPushButton("关闭")
+
+        toolbar = QHBoxLayout()
+        toolbar.addWidget(QLabel("缩放:"))
+        toolbar.addWidget(self.zoom_combo)
+        toolbar.addStretch()
+        toolbar.addWidget(QLabel("第"))
+        toolbar.addWidget(self.sheet_spinbox)
+        toolbar.addWidget(self.sheet_label)
+        toolbar.addStretch()
+        toolbar.addWidget(self.print_button)
+        toolbar.addWidget(self.close_button)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(toolbar)
+        layout.addWidget(self.view)
+
+        self.zoom_combo.currentIndexChanged.connect(self.zoom_changed)
+        self.sheet_spinbox.valueChanged.connect(self.sheet_selected)
+        self.view.current_sheet_changed.connect(self.current_sheet_changed)
+        self.print_button.clicked.connect(self._print_clicked)
+        self.close_button.clicked.connect(self.reject)
+
+        self.view.refresh()
+        sheet_count = self.sheet_renderer.get_sheet_count()
+        self.sheet_spinbox.setRange(1, max(1, sheet_count))
+        self.sheet_label.setText(f"/ {sheet_count} 张")
+
+    def zoom_changed(self, index):
+        zoom = self.zoom_combo.itemData(index)
+        if zoom == -1:
+            self.view.set_fit_width()
+        else:
+            # 缩放百分比相对于96 DPI的屏幕显示
+            self.view.set_zoom(zoom * 96 / 72.0)
+
+    def sheet_selected(self, value):
+        if value - 1 != self.view.get_current_sheet():
+            self.view.scroll_to_sheet(value - 1)
+
+    def current_sheet_changed(self, sheet_index):
+        self.sheet_spinbox.blockSignals(True)
+        self.sheet_spinbox.setValue(sheet_index + 1)
+        self.sheet_spinbox.blockSignals(False)
+
+    def _print_clicked(self):
+        self.accept()
+        self.print_requested.emit()
+
+    def done(self, result):
+        # 关闭时丢弃预览的排队任务和缓存的重排页面，不再接收后台渲染完成的通知
+        self.sheet_renderer.detach()
+        self.sheet_renderer.sheet_cache.clear()
+        if self.memory_budget is not None:
+            self.memory_budget.unregister_cache("preview")
+        super().done(result)
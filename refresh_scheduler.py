@@ -0,0 +1,62 @@
+from PyQt5.QtCore import QObject, QTimer
+
+
+class RefreshScheduler(QObject):
+    """合并界面事件触发的刷新请求的调度器 v2.0
+
+    拖动滚动条或滚动鼠标滚轮时会连续产生大量刷新请求。调度器只记录最新的目标，
+    在事件队列空闲时（最多每 interval_ms 毫秒一次）刷新一次，且不会重入。
+    页面需要后台渲染时由DisplayHandler显示占位图。
+    """
+
+    def __init__(self, display_refresher, interval_ms=15, parent=None):
+        super().__init__(parent)
+        self.display_refresher = display_refresher
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._flush)
+        self._pending = None  # (current_page, display_scale_factor)
+        self._refreshing = False
+        self.requested = 0
+        self.refreshed = 0
+
+    def request(self, current_page, display_scale_factor=1.0):
+        """请求刷新显示；在下一次刷新之前的请求只保留最新的一个"""
+        self._pending = (current_page, display_scale_factor)
+        self.requested += 1
+        # 不重新启动已在计时的定时器，保证连续拖动时仍按固定间隔刷新
+        if not self._refreshing and not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """立即执行尚未处理的刷新请求"""
+        self._timer.stop()
+        self._flush()
+
+    def cancel(self):
+        """丢弃尚未处理的刷新请求"""
+        self._timer.stop()
+        self._pending = None
+
+    def is_pending(self):
+        return self._pending is not None
+
+    def _flush(self):
+        if self._refreshing or self._pending is None:
+            return
+        self._refreshing = True
+        try:
+            current_page, display_scale_factor = self._pending
+            self._pending = None
+            self.display_refresher.refresh_display(current_page, display_scale_factor)
+            self.refreshed += 1
+        finally:
+            self._refreshing = False
+        # 刷新期间又收到了新的请求
+        if self._pending is not None:
+            self._timer.start()
+
+    def get_stats(self):
+        """获取请求数与实际刷新次数"""
+        return {"requested": self.requested, "refreshed": self.refreshed}
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+
+
+class RenderCache:
+    """按内存预算进行LRU淘汰的渲染结果缓存 v2.0"""
+
+    def __init__(self, max_memory_mb=256):
+        self._entries = OrderedDict()  # key -> (value, size_bytes)
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def estimate_size(image):
+        """估算QPixmap/QImage占用的字节数"""
+        if image is None:
+            return 0
+        if hasattr(image, "bytesPerLine"):
+            return image.bytesPerLine() * image.height()
+        return image.width() * image.height() * max(image.depth(), 8) // 8
+
+    def set_memory_budget(self, max_memory_mb):
+        """设置内存预算（MB），超出部分立即淘汰"""
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self._evict()
+
+    def get(self, key):
+        """查找缓存项，命中时将其移到最近使用的位置"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, key):
+        """查找缓存项但不计入命中/未命中，也不改变其使用顺序（用于绘制草稿等非真正复用的查找）"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, value, size_bytes=None):
+        """放入缓存项，必要时淘汰最久未使用的项"""
+        if size_bytes is None:
+            size_bytes = self.estimate_size(value)
+        # 单项超过预算时不缓存，避免把整个缓存清空
+        if size_bytes > self.max_bytes:
+            self.remove(key)
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[1]
+        self._entries[key] = (value, size_bytes)
+        self.current_bytes += size_bytes
+        self._evict()
+
+    def remove(self, key):
+        """移除指定缓存项"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[1]
+
+    def keys(self):
+        """全部缓存键（从最久未使用到最近使用）"""
+        return list(self._entries)
+
+    def clear(self):
+        """清空缓存（加载新文件或关闭文件时调用）"""
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def _evict(self):
+        while self._entries and self.current_bytes > self.max_bytes:
+            _, (_, size_bytes) = self._entries.popitem(last=False)
+            self.current_bytes -= size_bytes
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_mb": self.current_bytes / (1024 * 1024),
+            "max_memory_mb": self.max_bytes / (1024 * 1024),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+
+from disk_render_cache import DiskRenderCache
+from pdf_handler import PDFHandler, normalize_pixmap, samples_to_qimage
+from tracing import tracer
+
+
+# 优先级（数值越小越先渲染）
+PRIORITY_DRAFT = -1
+PRIORITY_VISIBLE = 0
+PRIORITY_PREFETCH = 10
+PRIORITY_THUMBNAIL = 20
+
+# 渲染进程中的PDF处理器（每个进程持有自己的fitz文档句柄，fitz文档不是线程安全的）
+_worker_pdf_handler = None
+_worker_document_id = None
+_worker_disk_cache = None
+
+
+def _render_in_worker(file_path, document_id, disk_cache_dir, fingerprint, trace,
+                      page_index, dpi, rotation, colorspace):
+    """在渲染进程中渲染页面，返回 (可跨进程传递的原始像素数据, 记录的跟踪区间)
+
+    document_id 标识主进程打开的文档（每次打开文档都不同），变化时重新打开文件，
+    即使路径相同（文件被修改后重新打开）也不会继续使用旧文档。
+    启用磁盘缓存时同时在渲染进程中压缩并写入缓存文件，由主进程登记。
+    trace 为True时在渲染进程中记录跟踪区间（主进程打开了跟踪）。
+    """
+    tracer.set_enabled(trace)
+    return _render_page_in_worker(file_path, document_id, disk_cache_dir, fingerprint,
+                                  page_index, dpi, rotation, colorspace), tracer.drain()
+
+
+def _render_page_in_worker(file_path, document_id, disk_cache_dir, fingerprint, page_index, dpi, rotation, colorspace):
+    """渲染页面并返回原始像素数据，无法渲染时返回None"""
+    global _worker_pdf_handler, _worker_document_id, _worker_disk_cache
+    if _worker_pdf_handler is None:
+        _worker_pdf_handler = PDFHandler(cache_memory_mb=0)
+    if _worker_pdf_handler.file_path != file_path or _worker_document_id != document_id:
+        _worker_pdf_handler.close()
+        _worker_document_id = None
+        if not _worker_pdf_handler.load_pdf(file_path, build_geometry=False):
+            return None
+        _worker_document_id = document_id
+
+    pix = _worker_pdf_handler.get_page_pixmap(page_index, dpi, rotation, colorspace)
+    if pix is None:
+        return None
+    pix = normalize_pixmap(pix)
+    if disk_cache_dir:
+        if _worker_disk_cache is None or _worker_disk_cache.cache_dir != disk_cache_dir:
+            _worker_disk_cache = DiskRenderCache(disk_cache_dir)
+        _worker_disk_cache.save(fingerprint, (page_index, dpi, rotation, colorspace), pix)
+    return pix.samples, pix.width, pix.height, pix.stride, pix.n, pix.alpha
+
+
+class RenderWorkerPool(QObject):
+    """在后台渲染进程中渲染页面的工作池 v2.0
+
+    PyMuPDF渲染时不释放GIL，线程池无法让界面保持响应，因此使用进程池。
+    渲染结果放入PDFHandler的渲染缓存后通过 page_rendered 信号通知GUI线程。
+    """
+
+    # 页面已渲染并放入缓存，参数为缓存键
+    page_rendered = pyqtSignal(object)
+    # 内部信号：把执行器线程中完成的任务转交给GUI线程处理
+    _job_done = pyqtSignal(object, object)
+
+    def __init__(self, pdf_handler, max_workers=None, parent=None):
+        super().__init__(parent)
+        self.pdf_handler = pdf_handler
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._executor = None
+        self._heap = []  # (优先级, 序号, 缓存键)
+        self._queued = {}  # 缓存键 -> (优先级, 序号, 标签, 是否写入磁盘缓存)
+        self._in_flight = {}  # 缓存键 -> 标签
+        self._generation = 0
+        self._sequence = itertools.count()
+        self._job_done.connect(self._on_job_done, Qt.QueuedConnection)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def submit(self, key, priority=PRIORITY_VISIBLE, tag=None, persist=False):
+        """提交渲染任务，返回False表示无法在后台渲染（调用者应同步渲染）
+
+        persist 为True时渲染结果同时写入磁盘缓存，只用于显示和预取的页面；
+        缩略图（另有缩略图缓存）和草稿不写入，以免挤占磁盘缓存的容量。
+        """
+        if self.pdf_handler.file_path is None:
+            return False
+        if key in self._in_flight or self.pdf_handler.has_rendered(key):
+            return True
+
+        queued = self._queued.get(key)
+        if queued is not None:
+            persist = persist or queued[3]
+            if queued[0] <= priority:
+                self._queued[key] = queued[:3] + (persist,)
+                return True
+        # 新任务，或以更高优先级重新排队（旧的堆项会被惰性跳过）
+        sequence = next(self._sequence)
+        self._queued[key] = (priority, sequence, tag, persist)
+        heapq.heappush(self._heap, (priority, sequence, key))
+        self._pump()
+        return True
+
+    def cancel(self, tag=None):
+        """取消尚未开始的任务（tag为None时取消全部），正在渲染的任务结果仍会进入缓存"""
+        if tag is None:
+            cancelled = len(self._queued)
+            self._queued.clear()
+            self._heap.clear()
+            return cancelled
+        keys = [key for key, (_, _, job_tag, _) in self._queued.items() if job_tag == tag]
+        for key in keys:
+            del self._queued[key]
+        return len(keys)
+
+    def reset(self):
+        """文档变化时调用：丢弃所有排队任务，忽略正在渲染的旧文档结果"""
+        self.cancel()
+        self._in_flight.clear()
+        self._generation += 1
+
+    def pending_count(self):
+        """排队和正在渲染的任务数"""
+        return len(self._queued) + len(self._in_flight)
+
+    def _pump(self):
+        while self._heap and len(self._in_flight) < self.max_workers:
+            priority, sequence, key = heapq.heappop(self._heap)
+            queued = self._queued.get(key)
+            if queued is None or queued[1] != sequence:
+                continue  # 已取消或已重新排队
+            del self._queued[key]
+            if self.pdf_handler.has_rendered(key):
+                continue
+
+            self._in_flight[key] = queued[2]
+            disk_cache = self.pdf_handler.disk_cache
+            persist = queued[3] and disk_cache is not None and self.pdf_handler.fingerprint is not None
+            job = (self._generation, key, persist)
+            try:
+                future = self._get_executor().submit(
+                    _render_in_worker, self.pdf_handler.file_path, self._generation,
+                    disk_cache.cache_dir if persist else None,
+                    self.pdf_handler.fingerprint, tracer.enabled, *key)
+            except (BrokenProcessPool, RuntimeError) as e:
+                logging.error(f"无法启动渲染进程: {str(e)}")
+                self._executor = None
+                # 以失败结果通知等待者，由其回退到同步渲染
+                self._job_done.emit(job, None)
+                continue
+            future.add_done_callback(lambda f, job=job: self._job_done.emit(job, f))
+
+    def _on_job_done(self, job, future):
+        generation, key, persist = job
+        if generation == self._generation:
+            self._in_flight.pop(key, None)
+            try:
+                result, events = future.result() if future is not None else (None, None)
+                tracer.add_events(events)
+            except BrokenProcessPool as e:
+                logging.error(f"渲染进程异常退出: {str(e)}")
+                self._executor = None
+                result = None
+            except Exception as e:
+                logging.error(f"后台渲染页面 {key[0]} 时出错: {str(e)}")
+                result = None
+
+            if result is not None:
+                with tracer.span("convert", page=key[0]):
+                    img = samples_to_qimage(*result)
+                self.pdf_handler.render_cache.put(key, img)
+                if persist and self.pdf_handler.disk_cache is not None:
+                    self.pdf_handler.disk_cache.record(self.pdf_handler.fingerprint, key)
+            # 失败时也通知，等待者会回退到同步渲染
+            self.page_rendered.emit(key)
+        self._pump()
+
+    def shutdown(self):
+        """关闭渲染进程"""
+        self.reset()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
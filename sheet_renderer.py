@@ -0,0 +1,122 @@
+import math
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from print_pipeline import compose_sheet, get_sheet_render_keys
+from render_cache import RenderCache
+from render_worker import PRIORITY_VISIBLE
+
+
+class SheetRenderer(QObject):
+    """按需合成重排页面（打印输出的样子）并缓存结果的类 v2.0
+
+    需要的PDF页面尚未渲染时提交到后台渲染工作池并返回None，
+    全部就绪后通过 sheet_ready 信号通知视图重新绘制。
+    """
+
+    # 重排页面的所需页面已全部渲染，参数为重排页面索引
+    sheet_ready = pyqtSignal(int)
+
+    def __init__(self, pdf_handler, scaling_handler, page_size_handler, layout_handler,
+                 render_pool=None, render_tag="sheet", cache_memory_mb=64, parent=None):
+        super().__init__(parent)
+        self.pdf_handler = pdf_handler
+        self.scaling_handler = scaling_handler
+        self.page_size_handler = page_size_handler
+        self.layout_handler = layout_handler
+        self.render_pool = render_pool
+        self.render_tag = render_tag
+        self.sheet_cache = RenderCache(cache_memory_mb)
+        self._context = None
+        self._pending = {}  # 重排页面缓存键 -> 尚未渲染完成的页面缓存键集合
+        self._failed = set()  # 后台渲染失败的页面缓存键，改为同步渲染
+        if render_pool is not None:
+            render_pool.page_rendered.connect(self._on_page_rendered)
+
+    def get_sheet_count(self):
+        """重排页面（打印输出的纸张）数量"""
+        pages_per_sheet = self.layout_handler.pages_per_sheet
+        return math.ceil(self.pdf_handler.get_page_count() / pages_per_sheet)
+
+    def get_sheet_size_points(self):
+        """纸张尺寸（点），与打印机的页面布局一致"""
+        return self.page_size_handler.get_page_size_points()
+
+    def _get_context(self):
+        """影响合成结果的全部设置；任意一项变化时缓存的重排页面都失效"""
+        return (self.pdf_handler.file_path,
+                self.pdf_handler.get_page_count(),
+                self.layout_handler.pages_per_sheet,
+                self.scaling_handler.scale_factor,
+                self.scaling_handler.rotation_angle,
+                self.page_size_handler.page_size,
+                self.page_size_handler.page_orientation)
+
+    def _check_context(self):
+        context = self._get_context()
+        if context != self._context:
+            self.cancel()
+            self.sheet_cache.clear()
+            self._failed.clear()
+            self._context = context
+
+    def detach(self):
+        """取消排队任务并断开与后台渲染工作池的连接（渲染器不再使用时调用）"""
+        self.cancel()
+        if self.render_pool is not None:
+            self.render_pool.page_rendered.disconnect(self._on_page_rendered)
+            self.render_pool = None
+
+    def cancel(self):
+        """取消尚未开始的后台渲染（例如已滚动到其他位置）"""
+        self._pending.clear()
+        if self.render_pool is not None:
+            self.render_pool.cancel(self.render_tag)
+
+    def release_outside(self, first, last):
+        """释放索引不在 [first, last] 范围内的重排页面图像（已滚动到视口之外）"""
+        for sheet_key in self.sheet_cache.keys():
+            if not first <= sheet_key[0] <= last:
+                self.sheet_cache.remove(sheet_key)
+
+    def get_sheet(self, sheet_index, width, height, priority=PRIORITY_VISIBLE, persist=False):
+        """获取 width x height 像素的重排页面图像；需要后台渲染时返回None
+
+        persist 为True时后台渲染的页面同时写入磁盘缓存（低分辨率的占位图不写入）。
+        """
+        self._check_context()
+        sheet_key = (sheet_index, width, height)
+        image = self.sheet_cache.get(sheet_key)
+        if image is not None:
+            return image
+
+        keys = get_sheet_render_keys(self.pdf_handler, self.scaling_handler, self.page_size_handler,
+                                     self.layout_handler, sheet_index, width, height)
+        missing = {key for key in keys
+                   if not self.pdf_handler.has_rendered(key) and key not in self._failed}
+        if missing and self.render_pool is not None:
+            if all(self.render_pool.submit(key, priority=priority, tag=self.render_tag, persist=persist)
+                   for key in missing):
+                self._pending[sheet_key] = missing
+                return None
+
+        # 页面都已在缓存中（或无法后台渲染），合成很快
+        image = QImage(width, height, QImage.Format_RGB888)
+        compose_sheet(image, self.pdf_handler, self.scaling_handler, self.page_size_handler,
+                      self.layout_handler, sheet_index)
+        self.sheet_cache.put(sheet_key, image)
+        return image
+
+    def _on_page_rendered(self, key):
+        if key not in self.pdf_handler.render_cache:
+            self._failed.add(key)
+        for sheet_key, missing in list(self._pending.items()):
+            missing.discard(key)
+            if not missing:
+                del self._pending[sheet_key]
+                self.sheet_ready.emit(sheet_key[0])
+
+    def get_stats(self):
+        """获取重排页面缓存统计信息"""
+        return self.sheet_cache.get_stats()
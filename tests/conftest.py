@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# 模块位于仓库根目录（没有打包），测试在无窗口环境中运行
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
@@ -0,0 +1,64 @@
+import fitz  # PyMuPDF
+import pytest
+from PyQt5.QtGui import QImage
+
+from imposition_handler import ImpositionHandler
+from layout_handler import LayoutHandler
+from page_size_handler import PageSizeHandler
+from pdf_handler import PDFHandler, samples_to_qimage
+from print_pipeline import compose_sheet
+from scaling_handler import ScalingHandler
+
+
+def _make_rotated_pdf(path):
+    """一页横向内容、/Rotate 90 的PDF：左上角红色，右下角蓝色"""
+    document = fitz.open()
+    page = document.new_page(width=400, height=250)
+    page.draw_rect(fitz.Rect(0, 0, 200, 125), color=(1, 0, 0), fill=(1, 0, 0))
+    page.draw_rect(fitz.Rect(200, 125, 400, 250), color=(0, 0, 1), fill=(0, 0, 1))
+    page.set_rotation(90)
+    document.save(path)
+    document.close()
+
+
+def _mean_difference(a, b):
+    assert (a.width(), a.height()) == (b.width(), b.height())
+    a = a.convertToFormat(QImage.Format_RGB888)
+    b = b.convertToFormat(QImage.Format_RGB888)
+    total = 0
+    count = 0
+    for y in range(0, a.height(), 4):
+        for x in range(0, a.width(), 4):
+            pa, pb = a.pixelColor(x, y), b.pixelColor(x, y)
+            total += abs(pa.red() - pb.red()) + abs(pa.green() - pb.green()) + abs(pa.blue() - pb.blue())
+            count += 3
+    return total / count
+
+
+@pytest.mark.parametrize("user_rotation", [0, 90, 180, 270])
+def test_rotated_page_matches_compose_sheet(qapp, tmp_path, user_rotation):
+    source_path = str(tmp_path / "rotated.pdf")
+    output_path = str(tmp_path / "imposed.pdf")
+    _make_rotated_pdf(source_path)
+
+    pdf_handler = PDFHandler()
+    assert pdf_handler.load_pdf(source_path)
+    scaling_handler = ScalingHandler()
+    scaling_handler.set_rotation_angle(user_rotation)
+    page_size_handler = PageSizeHandler()
+    page_size_handler.set_page_size("A4")
+    page_size_handler.set_page_orientation(pdf_handler.get_page_orientation(0))
+    layout_handler = LayoutHandler(page_size_handler)
+    layout_handler.set_pages_per_sheet(1)
+    layout_handler.set_adaptive_mode(True)
+
+    ImpositionHandler(page_size_handler, layout_handler, scaling_handler).impose(pdf_handler, output_path)
+
+    with fitz.open(output_path) as output:
+        pix = output[0].get_pixmap(dpi=36, alpha=False)
+        imposed = samples_to_qimage(pix.samples, pix.width, pix.height, pix.stride, pix.n, pix.alpha)
+        composed = QImage(pix.width, pix.height, QImage.Format_RGB888)
+        compose_sheet(composed, pdf_handler, scaling_handler, page_size_handler, layout_handler, 0)
+    pdf_handler.close()
+
+    assert _mean_difference(imposed, composed) < 8
@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import os
+import shutil
+
+from PyQt5.QtGui import QImage
+
+
+def get_default_cache_dir(name):
+    """获取应用缓存目录下的子目录（Windows使用LOCALAPPDATA，其他系统使用XDG_CACHE_HOME）"""
+    base_dir = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base_dir, "pdf_printer", name)
+
+
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    """计算文件内容的哈希（按块读取；hashlib在计算大块数据时会释放GIL，可在线程中调用）"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ThumbnailCache:
+    """按文件内容哈希和页面索引保存缩略图的磁盘缓存 v2.0
+
+    每个文档一个子目录，最多保留 max_documents 个最近使用的文档。
+    """
+
+    def __init__(self, cache_dir=None, max_documents=200):
+        self.cache_dir = cache_dir or get_default_cache_dir("thumbnails")
+        self.max_documents = max_documents
+
+    def _get_document_dir(self, file_hash):
+        return os.path.join(self.cache_dir, file_hash)
+
+    def _get_thumbnail_path(self, file_hash, page_index, width):
+        return os.path.join(self._get_document_dir(file_hash), f"{page_index}_{width}.png")
+
+    def contains(self, file_hash, page_index, width):
+        return os.path.exists(self._get_thumbnail_path(file_hash, page_index, width))
+
+    def load(self, file_hash, page_index, width):
+        """读取缩略图，不存在时返回None"""
+        path = self._get_thumbnail_path(file_hash, page_index, width)
+        if not os.path.exists(path):
+            return None
+        image = QImage(path)
+        return None if image.isNull() else image
+
+    def save(self, file_hash, page_index, width, image):
+        """保存缩略图（写入临时文件后改名，避免留下不完整的文件）"""
+        path = self._get_thumbnail_path(file_hash, page_index, width)
+        temp_path = path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if image.save(temp_path, "PNG"):
+                os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"无法保存缩略图: {str(e)}")
+
+    def touch(self, file_hash):
+        """标记文档最近被使用，并淘汰最久未使用的文档"""
+        document_dir = self._get_document_dir(file_hash)
+        try:
+            os.makedirs(document_dir, exist_ok=True)
+            os.utime(document_dir)
+            self.prune()
+        except OSError as e:
+            logging.warning(f"无法更新缩略图缓存: {str(e)}")
+
+    def prune(self):
+        """只保留最近使用的 max_documents 个文档的缩略图"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.is_dir()]
+        if len(entries) <= self.max_documents:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[self.max_documents:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
@@ -0,0 +1,177 @@
+import threading
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+from render_cache import RenderCache
+from render_worker import PRIORITY_THUMBNAIL
+from thumbnail_cache import compute_file_hash
+
+
+class ThumbnailModel(QAbstractListModel):
+    """缩略图列表的数据模型 v2.0
+
+    只有视图请求（即可见）的缩略图才会读取或渲染；磁盘缓存中没有的缩略图以低优先级
+    在后台渲染，并在空闲时依次补全整个文档的缩略图，下次打开同一文件时直接从磁盘读取。
+    """
+
+    # 缩略图宽度（像素）
+    THUMBNAIL_WIDTH = 120
+    # 提交到后台渲染工作池的任务标签
+    RENDER_TAG = "thumbnail"
+    # 后台补全缩略图时同时排队的任务数
+    SWEEP_BATCH = 2
+
+    # 内部信号：把哈希线程的结果转交给GUI线程
+    _hash_ready = pyqtSignal(str, str)
+
+    def __init__(self, pdf_handler, render_pool, thumbnail_cache, parent=None):
+        super().__init__(parent)
+        self.pdf_handler = pdf_handler
+        self.render_pool = render_pool
+        self.thumbnail_cache = thumbnail_cache
+        self.memory_cache = RenderCache(16)  # 页面索引 -> QImage
+        self.file_hash = None
+        self._hash_pending = False
+        self._page_count = 0
+        self._keys = {}  # 页面渲染缓存键 -> 页面索引
+        self._failed = set()  # 渲染失败的页面索引
+        self._sweep_next = 0
+        self._placeholder = self._create_placeholder()
+        self._hash_ready.connect(self._on_hash_ready)
+        render_pool.page_rendered.connect(self._on_page_rendered)
+
+    def get_icon_size(self):
+        return QSize(self.THUMBNAIL_WIDTH, int(self.THUMBNAIL_WIDTH * 1.42))
+
+    def _create_placeholder(self):
+        size = self.get_icon_size()
+        image = QImage(size, QImage.Format_RGB888)
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        painter.setPen(QColor(200, 200, 200))
+        painter.drawRect(0, 0, size.width() - 1, size.height() - 1)
+        painter.end()
+        return image
+
+    def reset_document(self):
+        """加载新文档后调用：重建列表，并在后台线程中计算文件哈希"""
+        self.beginResetModel()
+        self.render_pool.cancel(self.RENDER_TAG)
+        self.memory_cache.clear()
+        self._keys.clear()
+        self._failed.clear()
+        self._sweep_next = 0
+        self.file_hash = None
+        self._page_count = self.pdf_handler.get_page_count()
+        self.endResetModel()
+
+        file_path = self.pdf_handler.file_path
+        self._hash_pending = bool(file_path)
+        if file_path:
+            threading.Thread(target=self._compute_hash, args=(file_path,), daemon=True).start()
+
+    def _compute_hash(self, file_path):
+        try:
+            file_hash = compute_file_hash(file_path)
+        except OSError:
+            file_hash = ""  # 无法读取文件时不使用磁盘缓存
+        self._hash_ready.emit(file_path, file_hash)
+
+    def _on_hash_ready(self, file_path, file_hash):
+        if file_path != self.pdf_handler.file_path:
+            return  # 已经打开了其他文件
+        self._hash_pending = False
+        self.file_hash = file_hash or None
+        if self.file_hash is not None:
+            self.thumbnail_cache.touch(file_hash)
+        # 磁盘中已有的缩略图现在可以直接显示
+        if self._page_count:
+            self.dataChanged.emit(self.index(0), self.index(self._page_count - 1), [Qt.DecorationRole])
+        self._sweep()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._page_count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return str(index.row() + 1)
+        if role == Qt.DecorationRole:
+            return self.get_thumbnail(index.row())
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignHCenter | Qt.AlignTop
+        return None
+
+    def _get_render_key(self, page_index):
+        page_width, _ = self.pdf_handler.get_page_size(page_index)
+        if page_width <= 0:
+            return None
+        dpi = self.THUMBNAIL_WIDTH / page_width * 72.0
+        return self.pdf_handler.make_cache_key(page_index, dpi)
+
+    def get_thumbnail(self, page_index, priority=PRIORITY_THUMBNAIL):
+        """获取缩略图；尚未就绪时提交后台渲染并返回占位图"""
+        image = self.memory_cache.get(page_index)
+        if image is not None:
+            return image
+        if self.file_hash is not None:
+            image = self.thumbnail_cache.load(self.file_hash, page_index, self.THUMBNAIL_WIDTH)
+            if image is not None:
+                self.memory_cache.put(page_index, image)
+                return image
+
+        if self._hash_pending:
+            return self._placeholder  # 哈希算出后先查磁盘缓存，再决定是否渲染
+
+        key = self._get_render_key(page_index)
+        if key is None or key in self._keys or page_index in self._failed:
+            return self._placeholder
+        if not self.pdf_handler.has_rendered(key) and \
+                self.render_pool.submit(key, priority=priority, tag=self.RENDER_TAG):
+            self._keys[key] = page_index
+            return self._placeholder
+        # 已在内存或磁盘缓存中，或无法后台渲染（例如文档不是磁盘文件）时直接渲染
+        image = self.pdf_handler.render_page_image(page_index, key[1], persist=False)
+        self._store(page_index, image, key)
+        return image or self._placeholder
+
+    def _store(self, page_index, image, key):
+        # 缩略图不留在页面渲染缓存中，避免挤占显示用的页面
+        self.pdf_handler.render_cache.remove(key)
+        if image is None:
+            self._failed.add(page_index)
+            return
+        self.memory_cache.put(page_index, image)
+        if self.file_hash is not None:
+            self.thumbnail_cache.save(self.file_hash, page_index, self.THUMBNAIL_WIDTH, image)
+
+    def _on_page_rendered(self, key):
+        page_index = self._keys.pop(key, None)
+        if page_index is None:
+            return
+        self._store(page_index, self.pdf_handler.render_cache.get(key), key)
+        index = self.index(page_index)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+        self._sweep()
+
+    def _sweep(self):
+        """空闲时依次补全磁盘缓存中还没有的缩略图（优先级低于可见的缩略图）"""
+        if self.file_hash is None:
+            return
+        while len(self._keys) < self.SWEEP_BATCH and self._sweep_next < self._page_count:
+            page_index = self._sweep_next
+            self._sweep_next += 1
+            if page_index in self.memory_cache or \
+                    self.thumbnail_cache.contains(self.file_hash, page_index, self.THUMBNAIL_WIDTH):
+                continue
+            key = self._get_render_key(page_index)
+            if key is None or key in self._keys:
+                continue
+            if self.pdf_handler.has_rendered(key):
+                self._store(page_index, self.pdf_handler.render_page_image(page_index, key[1], persist=False), key)
+                continue
+            if not self.render_pool.submit(key, priority=PRIORITY_THUMBNAIL + 1, tag=self.RENDER_TAG):
+                return
+            self._keys[key] = page_index
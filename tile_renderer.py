@@ -0,0 +1,110 @@
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QImage, QPainter
+
+from render_cache import RenderCache
+from tracing import tracer
+
+
+class SheetTileRenderer:
+    """把一张页面（组）切分为固定大小的图块，按需渲染并缓存 v2.0
+
+    图块按设备像素对齐，只有与视口相交的图块才会渲染（页面内容用fitz clip只渲染图块覆盖的区域），
+    平移时离开视口的图块按LRU淘汰。draw_sheet(painter, current_page, clip_rect) 负责在
+    96 DPI自然尺寸的逻辑坐标中绘制页面（组）与 clip_rect 相交的部分。
+    """
+
+    # 图块边长（设备像素）
+    TILE_SIZE = 512
+
+    def __init__(self, draw_sheet, cache_memory_mb=96):
+        self.draw_sheet = draw_sheet
+        self.cache = RenderCache(cache_memory_mb)
+        self.sheet_key = None
+        self.current_page = None
+        self.width = 0  # 逻辑像素（显示尺寸）
+        self.height = 0
+        self.display_scale = 1.0
+        self.device_pixel_ratio = 1.0
+        self.rendered = 0  # 实际渲染的图块数
+
+    def set_sheet(self, sheet_key, current_page, width, height, display_scale=1.0, device_pixel_ratio=1.0):
+        """设置要显示的页面（组）；sheet_key 包含影响渲染结果的全部设置，其他页面的图块仍保留在缓存中"""
+        self.sheet_key = sheet_key
+        self.current_page = current_page
+        self.width = width
+        self.height = height
+        self.display_scale = display_scale
+        self.device_pixel_ratio = device_pixel_ratio
+
+    def clear(self):
+        """清空图块缓存"""
+        self.cache.clear()
+
+    def get_device_size(self):
+        return round(self.width * self.device_pixel_ratio), round(self.height * self.device_pixel_ratio)
+
+    def _get_tile_device_rect(self, col, row):
+        device_width, device_height = self.get_device_size()
+        x = col * self.TILE_SIZE
+        y = row * self.TILE_SIZE
+        return x, y, min(self.TILE_SIZE, device_width - x), min(self.TILE_SIZE, device_height - y)
+
+    def get_tile_rect(self, col, row):
+        """图块在逻辑坐标中的位置"""
+        x, y, width, height = self._get_tile_device_rect(col, row)
+        ratio = self.device_pixel_ratio
+        return QRectF(x / ratio, y / ratio, width / ratio, height / ratio)
+
+    def get_tiles(self, rect):
+        """与逻辑坐标中的矩形相交的全部图块 [(列, 行)]"""
+        device_width, device_height = self.get_device_size()
+        if self.sheet_key is None or device_width <= 0 or device_height <= 0:
+            return []
+        ratio = self.device_pixel_ratio
+        first_col = max(0, int(rect.left() * ratio) // self.TILE_SIZE)
+        first_row = max(0, int(rect.top() * ratio) // self.TILE_SIZE)
+        last_col = min((device_width - 1) // self.TILE_SIZE, int(rect.right() * ratio) // self.TILE_SIZE)
+        last_row = min((device_height - 1) // self.TILE_SIZE, int(rect.bottom() * ratio) // self.TILE_SIZE)
+        return [(col, row) for row in range(first_row, last_row + 1) for col in range(first_col, last_col + 1)]
+
+    def get_tile(self, col, row):
+        """获取图块（QImage，带设备像素比），未缓存时立即渲染"""
+        key = (self.sheet_key, col, row)
+        image = self.cache.get(key)
+        if image is not None:
+            return image
+
+        with tracer.span("compose", "tile", page=self.current_page, col=col, row=row):
+            image = self._render_tile(col, row)
+
+        self.cache.put(key, image)
+        self.rendered += 1
+        return image
+
+    def _render_tile(self, col, row):
+        x, y, width, height = self._get_tile_device_rect(col, row)
+        image = QImage(width, height, QImage.Format_RGB32)
+        image.setDevicePixelRatio(self.device_pixel_ratio)
+        image.fill(Qt.white)
+
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setRenderHint(QPainter.TextAntialiasing, True)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        # 移到图块左上角，再从显示坐标换算回96 DPI的自然尺寸坐标
+        logical_rect = self.get_tile_rect(col, row)
+        painter.translate(-logical_rect.left(), -logical_rect.top())
+        if abs(self.display_scale - 1.0) > 1e-6:
+            painter.scale(self.display_scale, self.display_scale)
+        scale = self.display_scale
+        clip_rect = QRectF(logical_rect.left() / scale, logical_rect.top() / scale,
+                           logical_rect.width() / scale, logical_rect.height() / scale)
+        self.draw_sheet(painter, self.current_page, clip_rect)
+        painter.end()
+        return image
+
+    def get_stats(self):
+        """获取图块缓存统计信息"""
+        stats = self.cache.get_stats()
+        stats["rendered"] = self.rendered
+        return stats
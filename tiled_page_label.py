@@ -0,0 +1,38 @@
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QPainter
+from PyQt5.QtWidgets import QLabel
+
+
+class TiledPageLabel(QLabel):
+    """可以按图块绘制超大页面的页面标签 v2.0
+
+    设置了图块渲染器 (SheetTileRenderer) 时只绘制与重绘区域（即滚动区域中可见的部分）相交的图块；
+    设置位图或清空标签时恢复为普通QLabel。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tile_renderer = None
+
+    def set_tile_renderer(self, tile_renderer):
+        """改为按图块绘制（标签尺寸由调用者设置为页面的显示尺寸）"""
+        super().clear()
+        self.tile_renderer = tile_renderer
+        self.update()
+
+    def setPixmap(self, pixmap):
+        self.tile_renderer = None
+        super().setPixmap(pixmap)
+
+    def clear(self):
+        self.tile_renderer = None
+        super().clear()
+
+    def paintEvent(self, event):
+        if self.tile_renderer is None:
+            super().paintEvent(event)
+            return
+        painter = QPainter(self)
+        for col, row in self.tile_renderer.get_tiles(QRectF(event.rect())):
+            painter.drawImage(self.tile_renderer.get_tile_rect(col, row), self.tile_renderer.get_tile(col, row))
+        painter.end()
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _NullSpan:
+    """关闭跟踪时返回的空上下文管理器（所有调用共用一个实例）"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "stage", "name", "args", "start", "child_ns")
+
+    def __init__(self, tracer, stage, name, args):
+        self.tracer = tracer
+        self.stage = stage
+        self.name = name
+        self.args = args
+        self.child_ns = 0
+
+    def __enter__(self):
+        self.tracer._push(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        self.tracer._pop(self, end)
+        return False
+
+
+class Tracer:
+    """按阶段记录耗时区间（span）的轻量跟踪器 v2.0
+
+    关闭时 span() 直接返回共用的空上下文管理器，几乎没有开销；可随时打开或关闭。
+    打开后记录每个区间的开始时间和时长，可导出为Chrome跟踪事件JSON（chrome://tracing 或
+    Perfetto中查看），并按阶段汇总次数、总耗时和自身耗时（减去嵌套的子区间，用于判断哪个阶段占主导）。
+    后台进程中记录的区间通过 drain() 随任务结果返回，由主进程 add_events() 合并。
+    """
+
+    def __init__(self, max_events=200000):
+        self.enabled = False
+        self.events = deque(maxlen=max_events)  # (阶段, 名称, 开始ns, 时长ns, 自身时长ns, pid, tid, 参数)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def set_enabled(self, enabled):
+        """打开或关闭跟踪（已记录的区间保留）"""
+        self.enabled = bool(enabled)
+
+    def span(self, stage, name=None, **args):
+        """记录一个区间: with tracer.span("render", page=3): ...（name默认与阶段相同）"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage, name or stage, args)
+
+    def _push(self, span):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(span)
+
+    def _pop(self, span, end):
+        stack = self._local.stack
+        stack.pop()
+        duration = end - span.start
+        if stack:
+            stack[-1].child_ns += duration
+        with self._lock:
+            self.events.append((span.stage, span.name, span.start, duration, duration - span.child_ns,
+                                os.getpid(), threading.get_ident(), span.args))
+
+    def drain(self):
+        """取出并清空已记录的区间（后台进程把它随任务结果返回）"""
+        with self._lock:
+            events = list(self.events)
+            self.events.clear()
+        return events
+
+    def add_events(self, events):
+        """合并其他进程中记录的区间"""
+        if events:
+            with self._lock:
+                self.events.extend(events)
+
+    def clear(self):
+        """清空已记录的区间"""
+        with self._lock:
+            self.events.clear()
+
+    def get_summary(self):
+        """按阶段汇总已记录的区间，见 summarize()"""
+        with self._lock:
+            events = list(self.events)
+        return self.summarize(events)
+
+    @staticmethod
+    def summarize(events):
+        """按阶段汇总 {阶段: {count, total_ms, self_ms, max_ms}}，按自身耗时从大到小排列"""
+        stages = {}
+        for stage, _, _, duration, self_duration, _, _, _ in events:
+            entry = stages.setdefault(stage, {"count": 0, "total_ms": 0.0, "self_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += duration / 1e6
+            entry["self_ms"] += self_duration / 1e6
+            entry["max_ms"] = max(entry["max_ms"], duration / 1e6)
+        ordered = sorted(stages.items(), key=lambda item: item[1]["self_ms"], reverse=True)
+        return {stage: {key: round(value, 3) if isinstance(value, float) else value for key, value in entry.items()}
+                for stage, entry in ordered}
+
+    def format_summary(self):
+        """各阶段汇总的文本形式（用于日志）"""
+        lines = [f"{'阶段':<10}{'次数':>8}{'总耗时(ms)':>14}{'自身耗时(ms)':>14}{'最长(ms)':>12}"]
+        for stage, entry in self.get_summary().items():
+            lines.append(f"{stage:<10}{entry['count']:>8}{entry['total_ms']:>14.1f}"
+                         f"{entry['self_ms']:>14.1f}{entry['max_ms']:>12.1f}")
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, file_path):
+        """导出为Chrome跟踪事件JSON文件，返回导出的区间数"""
+        with self._lock:
+            events = list(self.events)
+        trace_events = []
+        main_pid = os.getpid()
+        for pid in sorted({event[5] for event in events}):
+            trace_events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                                 "args": {"name": "main" if pid == main_pid else f"worker {pid}"}})
+        for stage, name, start, duration, _, pid, tid, args in events:
+            trace_events.append({"name": name, "cat": stage, "ph": "X", "ts": start / 1000, "dur": duration / 1000,
+                                 "pid": pid, "tid": tid, "args": args})
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms",
+                       "otherData": {"summary": self.get_summary()}}, f, ensure_ascii=False)
+        return len(events)
+
+
+# 进程内共用的跟踪器
+tracer = Tracer()
@@ -3,12 +3,14 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel,
                              QPushButton, QComboBox, QCheckBox, QSlider, 
                              QVBoxLayout, QHBoxLayout, QScrollArea, QGroupBox,
                              QFileDialog, QMessageBox, QProgressDialog, QSpinBox,
-                             QDoubleSpinBox, QStackedWidget, QLineEdit, QSizePolicy,
+                             QDoubleSpinBox, QStackedWidget, QLineEdit, QSizePolicy, QListView,
                              QProgressBar)
 from PyQt5.QtGui import QDoubleValidator
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QSize
 from PyQt5.QtGui import QIcon, QPixmap
 
+from tiled_page_label import TiledPageLabel
+
 class UIHandler(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -27,6 +29,9 @@ class UIHandler(QMainWindow):
         self.print_button.setEnabled(False)
         self.print_preview_button = QPushButton("打印预览")
         self.print_preview_button.setEnabled(False)
+        self.export_button = QPushButton("导出多页合一PDF")
+        self.export_button.setToolTip("按当前布局以矢量方式导出PDF（不栅格化）")
+        self.export_button.setEnabled(False)
         self.print_progress = QProgressBar() # Initialize print_progress here
         self.print_progress.setVisible(False) # Set initial visibility here
         
@@ -75,6 +80,9 @@ class UIHandler(QMainWindow):
         
         self.adaptive_checkbox = QCheckBox("自适应模式")
         self.adaptive_checkbox.setChecked(True)  # 默认勾选自适应模式
+
+        self.continuous_checkbox = QCheckBox("连续滚动")
+        self.continuous_checkbox.setToolTip("纵向连续显示所有重排页面，只渲染可见的页面")
         
         self.prev_button = QPushButton("上一页")
         self.prev_button.setEnabled(False)
@@ -138,6 +146,7 @@ class UIHandler(QMainWindow):
         file_layout.addWidget(self.print_preview_button)
         self.print_button.setText("直接打印")
         file_layout.addWidget(self.print_button)
+        file_layout.addWidget(self.export_button)
         
         # 缩放组
         zoom_group = QGroupBox("缩放")
@@ -172,8 +181,9 @@ class UIHandler(QMainWindow):
         zoom_row1.addWidget(QLabel("%"))
         zoom_row1.addStretch()  # 添加弹性空间
         
-        # 第二行：空行保持布局一致性
+        # 第二行：连续滚动模式
         zoom_row2 = QHBoxLayout()
+        zoom_row2.addWidget(self.continuous_checkbox)
         zoom_row2.addStretch()
         
         zoom_layout.addLayout(zoom_row1)
@@ -245,13 +255,34 @@ class UIHandler(QMainWindow):
         self.scroll_area.setFrameShape(QScrollArea.NoFrame)  # 移除边框以获得更好的外观
         
         # 创建页面标签
-        self.page_label = QLabel("请加载PDF文件")
+        self.page_label = TiledPageLabel("请加载PDF文件")  # 超大页面按图块绘制
         self.page_label.setAlignment(Qt.AlignCenter)
         self.page_label.setMinimumSize(400, 600)
         self.page_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         
         self.scroll_area.setWidget(self.page_label)
-        display_layout.addWidget(self.scroll_area)
+
+        # 单页显示与连续滚动视图（由主程序添加）共用显示区域
+        self.display_stack = QStackedWidget()
+        self.display_stack.addWidget(self.scroll_area)
+
+        # 缩略图栏（数据模型由主程序设置）
+        self.thumbnail_list = QListView()
+        self.thumbnail_list.setViewMode(QListView.IconMode)
+        self.thumbnail_list.setFlow(QListView.TopToBottom)
+        self.thumbnail_list.setWrapping(False)
+        self.thumbnail_list.setMovement(QListView.Static)
+        self.thumbnail_list.setUniformItemSizes(True)
+        self.thumbnail_list.setIconSize(QSize(120, 170))
+        self.thumbnail_list.setSpacing(4)
+        self.thumbnail_list.setFixedWidth(170)
+        self.thumbnail_list.setEditTriggers(QListView.NoEditTriggers)
+
+        display_row = QHBoxLayout()
+        display_row.setSpacing(5)
+        display_row.addWidget(self.thumbnail_list)
+        display_row.addWidget(self.display_stack, 1)
+        display_layout.addLayout(display_row)
         
         # 设置滚动区域的尺寸策略
         self.scroll_area.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
@@ -0,0 +1,188 @@
+from PyQt5.QtCore import QRectF, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import QAbstractScrollArea
+
+from render_worker import PRIORITY_PREFETCH, PRIORITY_VISIBLE
+
+
+class VirtualSheetView(QAbstractScrollArea):
+    """虚拟化的重排页面纵向列表视图 v2.0
+
+    滚动范围由纸张尺寸直接计算，不需要渲染；只有与视口相交的重排页面才会向
+    SheetRenderer 请求图像。尚未就绪时先显示低分辨率版本或空白纸张，
+    因此打开视图的开销与页数无关。视口上下 margin_screens 屏范围内的页面在后台预渲染，
+    范围之外的重排页面图像会被释放，内存占用与页数无关。
+    """
+
+    # 视口中央的重排页面变化，参数为重排页面索引
+    current_sheet_changed = pyqtSignal(int)
+
+    # 低分辨率占位图相对最终图像的缩小倍数
+    PLACEHOLDER_DIVISOR = 4
+
+    def __init__(self, sheet_renderer, margin_screens=1.0, parent=None):
+        super().__init__(parent)
+        self.sheet_renderer = sheet_renderer
+        self.margin_screens = margin_screens
+        self.spacing = 16  # 重排页面之间的间距（像素）
+        self.zoom = 1.0  # 每个点对应的像素数
+        self.fit_width = True
+        self._sheet_count = 0
+        self._sheet_size = (0.0, 0.0)  # 纸张尺寸（点）
+        self._current_sheet = -1
+
+        self.viewport().setBackgroundRole(self.backgroundRole())
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+        sheet_renderer.sheet_ready.connect(self._on_sheet_ready)
+
+    def refresh(self):
+        """重新读取重排页面数量和纸张尺寸（布局设置变化后调用）"""
+        self._sheet_count = self.sheet_renderer.get_sheet_count()
+        self._sheet_size = self.sheet_renderer.get_sheet_size_points()
+        self._update_scrollbars()
+        self.viewport().update()
+        self._on_scrolled()
+
+    def set_zoom(self, zoom):
+        """设置缩放（每个点对应的像素数），保持当前重排页面在视图中"""
+        current_sheet = max(0, self._current_sheet)
+        self.fit_width = False
+        self.zoom = max(0.05, zoom)
+        self._update_scrollbars()
+        self.scroll_to_sheet(current_sheet)
+        self.viewport().update()
+
+    def set_fit_width(self):
+        """缩放到纸张宽度适应视口宽度"""
+        current_sheet = max(0, self._current_sheet)
+        self.fit_width = True
+        self._update_scrollbars()
+        self.scroll_to_sheet(current_sheet)
+        self.viewport().update()
+
+    def _get_sheet_pixel_size(self):
+        sheet_width, sheet_height = self._sheet_size
+        if self.fit_width and sheet_width > 0:
+            self.zoom = max(0.05, (self.viewport().width() - 2 * self.spacing) / sheet_width)
+        return max(1, int(sheet_width * self.zoom)), max(1, int(sheet_height * self.zoom))
+
+    def get_sheet_rect(self, sheet_index):
+        """重排页面在内容坐标中的矩形"""
+        width, height = self._get_sheet_pixel_size()
+        content_width = width + 2 * self.spacing
+        x = max(self.spacing, (self.viewport().width() - width) // 2) if content_width <= self.viewport().width() \
+            else self.spacing
+        y = self.spacing + sheet_index * (height + self.spacing)
+        return QRectF(x, y, width, height)
+
+    def _update_scrollbars(self):
+        width, height = self._get_sheet_pixel_size()
+        content_width = width + 2 * self.spacing
+        content_height = self._sheet_count * (height + self.spacing) + self.spacing
+        viewport = self.viewport()
+
+        vertical = self.verticalScrollBar()
+        vertical.setPageStep(viewport.height())
+        vertical.setSingleStep(max(20, height // 20))
+        vertical.setRange(0, max(0, content_height - viewport.height()))
+
+        horizontal = self.horizontalScrollBar()
+        horizontal.setPageStep(viewport.width())
+        horizontal.setSingleStep(20)
+        horizontal.setRange(0, max(0, content_width - viewport.width()))
+
+    def scroll_to_sheet(self, sheet_index):
+        """滚动到指定重排页面的顶部"""
+        if self._sheet_count == 0:
+            return
+        sheet_index = max(0, min(sheet_index, self._sheet_count - 1))
+        self.verticalScrollBar().setValue(int(self.get_sheet_rect(sheet_index).top()) - self.spacing)
+
+    def get_visible_range(self, margin=0):
+        """与视口（上下各扩展margin像素）相交的重排页面索引范围 (first, last)，没有时返回None"""
+        if self._sheet_count == 0:
+            return None
+        _, height = self._get_sheet_pixel_size()
+        stride = height + self.spacing
+        top = self.verticalScrollBar().value() - margin
+        bottom = self.verticalScrollBar().value() + self.viewport().height() + margin
+        first = max(0, (top - self.spacing) // stride)
+        last = min(self._sheet_count - 1, bottom // stride)
+        if first > last:
+            return None
+        return first, last
+
+    def get_current_sheet(self):
+        """当前（视口中央）的重排页面索引"""
+        return self._current_sheet
+
+    def _on_scrolled(self, *_):
+        _, height = self._get_sheet_pixel_size()
+        if self._sheet_count == 0:
+            return
+        # 页面比视口矮时以顶部页面的中线为准，保证 scroll_to_sheet 之后当前页面不变
+        center = self.verticalScrollBar().value() + min(self.viewport().height(), height) // 2
+        sheet_index = max(0, min(self._sheet_count - 1, center // (height + self.spacing)))
+        if sheet_index != self._current_sheet:
+            self._current_sheet = sheet_index
+            self.current_sheet_changed.emit(sheet_index)
+
+    def _on_sheet_ready(self, sheet_index):
+        visible = self.get_visible_range()
+        if visible is not None and visible[0] <= sheet_index <= visible[1]:
+            self.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_scrollbars()
+
+    def _get_pixel_size(self, rect):
+        device_pixel_ratio = self.devicePixelRatioF()
+        return max(1, int(rect.width() * device_pixel_ratio)), max(1, int(rect.height() * device_pixel_ratio))
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        visible = self.get_visible_range()
+        # 不再可见的重排页面的排队任务都取消，只为当前可见的页面排队
+        self.sheet_renderer.cancel()
+        if visible is None:
+            painter.end()
+            return
+
+        offset_x = self.horizontalScrollBar().value()
+        offset_y = self.verticalScrollBar().value()
+        for sheet_index in range(visible[0], visible[1] + 1):
+            rect = self.get_sheet_rect(sheet_index).translated(-offset_x, -offset_y)
+            pixel_width, pixel_height = self._get_pixel_size(rect)
+
+            painter.fillRect(rect.translated(3, 3), QColor(0, 0, 0, 60))
+            painter.fillRect(rect, Qt.white)
+
+            image = self.sheet_renderer.get_sheet(sheet_index, pixel_width, pixel_height,
+                                                  priority=PRIORITY_VISIBLE + 1, persist=True)
+            if image is None:
+                # 先显示低分辨率版本，最终图像就绪后再替换
+                image = self.sheet_renderer.get_sheet(
+                    sheet_index,
+                    max(1, pixel_width // self.PLACEHOLDER_DIVISOR),
+                    max(1, pixel_height // self.PLACEHOLDER_DIVISOR),
+                    priority=PRIORITY_VISIBLE)
+            if image is not None:
+                painter.drawImage(rect, image)
+            else:
+                painter.setPen(Qt.lightGray)
+                painter.drawText(rect, Qt.AlignCenter, "正在渲染...")
+        painter.end()
+
+        # 视口上下的页面以较低优先级预渲染，更远的页面图像被释放
+        margin = self.get_visible_range(int(self.viewport().height() * self.margin_screens))
+        for sheet_index in range(margin[0], margin[1] + 1):
+            if visible[0] <= sheet_index <= visible[1]:
+                continue
+            distance = visible[0] - sheet_index if sheet_index < visible[0] else sheet_index - visible[1]
+            pixel_width, pixel_height = self._get_pixel_size(self.get_sheet_rect(sheet_index))
+            self.sheet_renderer.get_sheet(sheet_index, pixel_width, pixel_height,
+                                          priority=PRIORITY_PREFETCH + distance, persist=True)
+        self.sheet_renderer.release_outside(*margin)